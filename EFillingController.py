@@ -1,32 +1,84 @@
 import logging
 import os
 import time
+import contextlib
 import datetime
-import urllib.request
+import functools
+import multiprocessing
 from logging.handlers import RotatingFileHandler
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import (ElementClickInterceptedException, StaleElementReferenceException, NoSuchElementException)
 
-import numpy as np
-import pandas as pd
+from catalog import CATALOG_FILENAME, FilingsCatalog, file_digest
+from download_output import FolderOutput, create_output
+from instrumentation import DriverMetrics, job_phase, notify_driver_started, notify_file_downloaded, profile_call
+from job_queue import InMemoryJobQueue, LeaseKeeper, LeaseLost, SQLiteJobQueue, default_worker_id, new_run_id
+from job_watchdog import (JobTimeout, JobWatchdog, browser_process_tree, forget_browsers, reap_orphaned_browsers, reap_processes,
+                          register_browser)
+from naming import (base_file_name, classify_download, construct_download_directory, convert_thai_month_to_eng, convert_thai_year_to_eng,
+                    filter_names, numbered_file_name)
+from page_objects import EFilingPages
+from pdf_extraction import PdfExtractionQueue
+from pdf_validation import PdfValidationQueue, fetch_url
+from progress import ProgressTracker
+from tab_scheduler import TabScheduler, TabTask
+from xlsx_reader import read_xlsx_rows
 
 # Constants
 MAX_ATTEMPTS = 5
 WAIT_TIMEOUT = 10
 TIME_SLEEP = 2
+VALIDATE_DOWNLOADS = os.environ.get("EFILLING_VALIDATE", "1") != "0"
+OUTPUT_BACKEND = os.environ.get("EFILLING_OUTPUT", "folder")  # folder, zip or tar
+JOB_QUEUE_PATH = os.environ.get("EFILLING_QUEUE")  # SQLite file on a shared volume
+RUN_ID = os.environ.get("EFILLING_RUN_ID")  # a new value starts a new run, every host of one run uses the same
+QUEUE_POLL_INTERVAL = 5
+BASE_URL = os.environ.get("EFILLING_BASE_URL", "https://efiling.rd.go.th").rstrip("/")
+LOGIN_URL = f"{BASE_URL}/rd-efiling-web/login"
+FORM_STATUS_URL = f"{BASE_URL}/rd-efiling-web/form-status"
+HEADLESS = os.environ.get("EFILLING_HEADLESS") == "1"
+PROFILE_MODE = os.environ.get("EFILLING_PROFILE", "")  # cprofile, sample or empty
+METRICS_REPORT_FILENAME = "webdriver_metrics.jsonl"
+EXTRACT_TEXT = os.environ.get("EFILLING_EXTRACT") == "1"
+TABS = max(1, int(os.environ.get("EFILLING_TABS", "1")))  # periods downloaded side by side in one browser
+
+def read_excel_rows(file_path):
+    """
+    Read the first sheet of an Excel file into dictionaries.
+
+    The built-in .xlsx reader is used so pandas is not loaded at startup. pandas is
+    only imported as a fallback for files the built-in reader cannot handle, such as
+    legacy .xls workbooks.
+
+    Args:
+        file_path (str): Path of the Excel file.
+
+    Returns:
+        list: One dictionary per row with string values and None for empty cells.
+    """
+    try:
+        return read_xlsx_rows(file_path)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        logging.warning(f"Built-in reader failed on {file_path}: {e}, falling back to pandas")
+
+    try:
+        import pandas as pd  # Heavy import, only needed for the fallback path
+    except ImportError as e:
+        # The packaged build leaves pandas out, see EFillingController.spec
+        raise RuntimeError(f"Cannot read {file_path}: only .xlsx workbooks are supported in the packaged build") from e
+    df = pd.read_excel(file_path, dtype=str)
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict('records')
 
 def read_credentials_from_excel(file_path):
     credentials = []
-    df = pd.read_excel(file_path, dtype=str)
-    for index, row in df.iterrows():
+    for index, row in enumerate(read_excel_rows(file_path)):
         username = row['username']
         password = row['password']
         company_name = row['company_name']
@@ -35,20 +87,16 @@ def read_credentials_from_excel(file_path):
 
 def read_filter_options_from_excel(file_path):
     options = []
-    df = pd.read_excel(file_path, dtype=str)
-
-    # Replace NaN values with a placeholder string
-    df_filled = df.fillna(value='placeholder')
-    # Replace the placeholder string with None
-    df_filled = df_filled.where(df_filled != 'placeholder', None)
-
-    tax_form = df_filled['ประเภทแบบ'][0]
-    tax_year = df_filled['ปีภาษี/ปี พ.ศ.ของวันสิ้นสุดรอบบัญชี'][0]
-    tax_month = df_filled['เดือนภาษี'][0]
-    tax_id = df_filled['เลขประจำตัวผู้เสียภาษีอากร'][0]
-    tax_company = df_filled['ชื่อผู้เสียภาษี'][0]
-    tax_ref = df_filled['หมายเลขอ้างอิงรอชำระเงิน/หมายเลขอ้างอิงการยื่นแบบ'][0]
-    tax_status = df_filled['ผลการยื่นแบบ'][0]
+    # Empty cells are already returned as None
+    first_row = read_excel_rows(file_path)[0]
+
+    tax_form = first_row['ประเภทแบบ']
+    tax_year = first_row['ปีภาษี/ปี พ.ศ.ของวันสิ้นสุดรอบบัญชี']
+    tax_month = first_row['เดือนภาษี']
+    tax_id = first_row['เลขประจำตัวผู้เสียภาษีอากร']
+    tax_company = first_row['ชื่อผู้เสียภาษี']
+    tax_ref = first_row['หมายเลขอ้างอิงรอชำระเงิน/หมายเลขอ้างอิงการยื่นแบบ']
+    tax_status = first_row['ผลการยื่นแบบ']
     
     options.append({'tax_form': tax_form, 'tax_year': tax_year, 'tax_month': tax_month, 'tax_id': tax_id, 'tax_company': tax_company, 'tax_ref': tax_ref, 'tax_status': tax_status})
     
@@ -88,82 +136,6 @@ def retry_function(func, *args, **kwargs):
             logging.warning(f"Encountered exception: {e}, retrying...")
     raise Exception("Function failed after multiple attempts")
     
-def find_element_with_retry(driver, locator):
-    """Find element matching the locator with a retry mechanism."""
-    logging.info("Finding element with retry")
-    return retry_function(WebDriverWait(driver, WAIT_TIMEOUT).until, EC.visibility_of_element_located(locator))
-
-def find_all_elements_with_retry(driver, locator):
-    """Find all elements matching the locator with a retry mechanism."""
-    logging.info("Finding all elements with retry")
-    return retry_function(WebDriverWait(driver, WAIT_TIMEOUT).until, EC.visibility_of_all_elements_located(locator))
-
-def find_clickable_with_retry(driver, locator):
-    """Find a clickable element matching the locator with a retry mechanism."""
-    logging.info("Finding clickable element with retry")
-    return retry_function(WebDriverWait(driver, WAIT_TIMEOUT).until, EC.element_to_be_clickable(locator))
-
-def click_element_with_retry(driver, element, fallback_locator=None, index=0):
-    """
-    Click on an element with a retry mechanism.
-
-    Args:
-        driver: Selenium WebDriver instance.
-        element: Element to click.
-        fallback_locator: Locator to use as a fallback if the original element is stale.
-
-    Returns:
-        None
-    """
-    for attempt in range(1, MAX_ATTEMPTS + 1):
-        try:
-            logging.info(f'Attempt {attempt}: Clicking on {element}')
-            element.click()
-            logging.info(f'Click successful on attempt {attempt}')
-            return
-        except ElementClickInterceptedException as intercepted_e:
-            logging.warning(f"Attempt {attempt}: Click failed due to intercepted element: {intercepted_e}")
-            logging.warning(f"Attempt {attempt}: Trying click on button with JavaScript on element: {element}")
-            try:
-                driver.execute_script("arguments[0].click();", element)
-                logging.info(f"Attempt {attempt}: Success clicking button with JavaScript")
-                return
-            except Exception as js_e:
-                logging.warning(f"Attempt {attempt}: Failed clicking button with JavaScript: {e}")
-                continue  # Retry finding elements
-        except StaleElementReferenceException as stale_e:
-            logging.warning(f"Click failed due to stale element: {stale_e}")
-            if fallback_locator is None:
-                logging.warning(f"No fallback locator set, skip trying")
-                continue
-            try:
-                logging.warning(f"Attempt {attempt}: Trying to locate an element")
-                element = WebDriverWait(driver, WAIT_TIMEOUT).until(EC.visibility_of_all_elements_located(fallback_locator))[index]
-                logging.info("Trying to click on a newly located element")
-                click_element_with_retry(driver, element)
-                logging.info(f"Attempt {attempt}: Success waiting for element to be clickable and clicking")
-                return
-            except Exception as click_e:
-                logging.warning(f"Attempt {attempt}: Cannot click on an element: {click_e}")
-                continue  # Retry finding elements
-        except NoSuchElementException as no_ele_e:
-            logging.warning(f"Click failed due to no element: {no_ele_e}")
-            logging.info("Trying to locate element after element presented")
-            element = WebDriverWait(driver, WAIT_TIMEOUT).until(EC.visibility_of_all_elements_located(fallback_locator))[index]
-            try:
-                logging.info("Trying to click on a newly located element")
-                click_element_with_retry(driver, element)
-                logging.info(f"Attempt {attempt}: Success waiting for element to be clickable and clicking")
-            except Exception as click_e:
-                logging.warning(f"Attempt {attempt}: Cannot click on an element: {click_e}")
-                continue  # Retry finding elements
-        except Exception as e:
-            logging.error(f"Attempt {attempt}: Waiting for element to be clickable and clicking failed: {e}")
-            move_element_to_viewport(driver, element)
-            continue  # Retry finding elements
-    raise RuntimeError(f"Failed to click element after {MAX_ATTEMPTS} attempts")
-
-
 def press_esc(driver):
     """
     Press the ESC key using Selenium.
@@ -196,70 +168,14 @@ def press_esc_with_retry(driver):
     logging.error("Failed to press ESC key after multiple attempts")
 
 
-def is_element_in_viewport(driver, element):
-    """
-    Check if an element is within the viewport.
-
-    Args:
-        driver: Selenium WebDriver instance.
-        element: WebElement.
-
-    Returns:
-        bool: True if element is in the viewport, False otherwise.
-    """
-    for _ in range(MAX_ATTEMPTS):  # Retry up to 3 times
-        try:
-            logging.info("Try moving to element with Selenium")
-            ActionChains(driver).move_to_element(element).perform()
-            logging.info("Successful moving to element")
-            return element.is_displayed()
-        except Exception as e:
-            logging.warning("Cannot move to element by Selenium, try using JavaScript...")
-            try:
-                logging.info("Try moving to element with JavaScript")
-                return driver.execute_script("""
-                    var elem = arguments[0];
-                    var bounding = elem.getBoundingClientRect();
-                    return (
-                        bounding.top >= 0 &&
-                        bounding.left >= 0 &&
-                        bounding.bottom <= (window.innerHeight || document.documentElement.clientHeight) &&
-                        bounding.right <= (window.innerWidth || document.documentElement.clientWidth)
-                    );
-                """, element)
-            except Exception as js_e:
-                logging.warning(f"Encountered exception: {js_e}, retrying...")
-                continue  # Retry checking element visibility
-    logging.error("Failed to check element visibility after multiple attempts")
-    return False  # Return False if unable to determine visibility
-
-def move_element_to_viewport(driver, element):
-    """
-    Move the element to the viewport if it's not already there.
-
-    Args:
-        driver: Selenium WebDriver instance.
-        element: WebElement.
-
-    Returns:
-        None
-    """
-    if not is_element_in_viewport(driver, element):
-        try:
-            logging.info("Try moving to element with Selenium")
-            ActionChains(driver).move_to_element(element).perform()
-            logging.info("Successful moving to element to viewport")
-            return True
-        except Exception as sel_e:
-            logging.error("Cannot scroll to the element using Selenium", sel_e)
-            try:
-                logging.info("Try moving to element with JavaScript")
-                driver.execute_script("arguments[0].scrollIntoView(true);", element)
-                logging.info("Successful moving to element to viewport")
-            except Exception as js_e:
-                logging.error("Cannot scroll to the element using JavaScript", js_e)
+@functools.lru_cache(maxsize=None)
+def get_chromedriver_path():
+    """Install chromedriver once per process, importing webdriver_manager only when a browser is started."""
+    from webdriver_manager.chrome import ChromeDriverManager
+    logging.info("Installing chromedriver...")
+    return ChromeDriverManager().install()
 
-def login(username, password, login_url):
+def login(username, password, login_url, pages=None, observers=None):
     """
     Login to the website.
 
@@ -267,303 +183,116 @@ def login(username, password, login_url):
         username: Username for login.
         password: Password for login.
         login_url: URL for login page.
+        pages: Optional EFilingPages attached to the new browser.
+        observers: Optional job observers told about the new browser.
 
     Returns:
         WebDriver instance after successful login.
     """
     logging.info("Logging in...")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+    chrome_options = webdriver.ChromeOptions()
+    if HEADLESS:
+        chrome_options.add_argument("--headless=new")
+    driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=chrome_options)
+    # Recorded so a later start can clean up the browser if this worker dies
+    register_browser(driver)
+    notify_driver_started(observers, driver)
     driver.get(login_url)
     try:
-        username_field = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, 'username')))
-        username_field.send_keys(username)
-        password_field = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, 'passwordField')))
-        password_field.send_keys(password)
-        password_field.send_keys(Keys.RETURN)
-        WebDriverWait(driver, 10).until(EC.title_is('ยื่นแบบ'))
+        pages = pages or EFilingPages()
+        pages.attach(driver)
+        pages.login.login(username, password)
         logging.info("Login successful")
         return driver
     except Exception as e:
         logging.error("An error occurred during login: %s", e)
+        # The browser is already running, do not leave it behind
+        logout(driver)
         return None
 
 def navigate_to_pdf_page(driver):
     logging.info("Navigating to all tax form page...")
-    retry_function(driver.get, 'https://efiling.rd.go.th/rd-efiling-web/form-status')
+    retry_function(driver.get, FORM_STATUS_URL)
 
-def open_filter_panel(driver):
+def open_filter_panel(driver, pages=None):
+    pages = pages or EFilingPages(driver)
 
     attemps = 0
     while attemps < MAX_ATTEMPTS:
 
         logging.info(f"Opening filter panel, attempt {attemps + 1}...")
         try:
-            filter_button = find_element_with_retry(driver, (By.XPATH, "//div[@class='collapsed' and @aria-expanded='true']"))
-        except Exception as e:
-            logging.error(f"Failed to find open filter panel button: {e}")
-            attemps += 1
-            continue
-
-        try:
-            click_element_with_retry(driver, filter_button)
+            pages.filter.open_panel()
             logging.info("Filter panel opened successfully")
             break
         except Exception as e:
-            logging.error(f"Failed to click filter button: {e}")
+            logging.error(f"Failed to open filter panel: {e}")
+            pages.filter.invalidate()
             attemps += 1
             continue
 
-def select_dropdown_item(driver, form, select_item):
-    
+def select_dropdown_item(driver, form, select_item, pages=None):
+    pages = pages or EFilingPages(driver)
+
     attempts = 0
     while attempts < MAX_ATTEMPTS:
 
         logging.info(f"Selecting '{select_item}' from dropdown menu, attempt {attempts + 1}...")
-
-        try:
-            dropdown_button = find_element_with_retry(driver, (By.CSS_SELECTOR, f"ng-select[formcontrolname='{form}']"))
-        except Exception as e:
-            press_esc_with_retry(driver)
-            logging.error(f"Failed to open dropdown menu: {e}")
-            attempts += 1
-            continue
-
-        try:
-            click_element_with_retry(driver, dropdown_button)
-        except Exception as e:
-            press_esc_with_retry(driver)
-            logging.error(f"Failed to click dropdown button: {e}")
-            attempts += 1
-            continue
-
-        try:
-            select_item_button = find_element_with_retry(driver, (By.XPATH, f"//span[@class='ng-option-label ng-star-inserted' and contains(text(), '{select_item}')]"))
-        except Exception as e:
-            press_esc_with_retry(driver)
-            logging.error(f"Failed to find selected item from dropdown: {e}")
-            attempts += 1
-            continue
-
         try:
-            click_element_with_retry(driver, select_item_button)
+            pages.filter.select(form, select_item)
             logging.info(f"Successfully selected '{select_item}' from dropdown menu")
             break
         except Exception as e:
             press_esc_with_retry(driver)
-            logging.error(f"Failed to click dropdown item: {e}")
+            logging.error(f"Failed to select dropdown item: {e}")
+            pages.filter.invalidate()
             attempts += 1
             continue
 
-def input_item(driver, form, input_item):
+def input_item(driver, form, input_item, pages=None):
+    pages = pages or EFilingPages(driver)
 
     attemp = 0
     while attemp < MAX_ATTEMPTS:
 
         logging.info(f"Inputting '{input_item}' into form, attempt {attemp + 1}...")
         try:
-            input_element = find_element_with_retry(driver, (By.XPATH, f"//input[@formcontrolname='{form}']"))
-        except Exception as e:
-            logging.error(f"Failed to find input field: {e}")
-            attemp += 1
-            continue
-
-        try:
-            input_element.send_keys(input_item)
+            pages.filter.type(form, input_item)
             logging.info(f"Successfully inputted '{input_item}' into form")
             break
         except Exception as e:
             logging.error(f"Failed to input item: {e}")
+            pages.filter.invalidate()
             attemp += 1
             continue
 
-def fill_form(driver, filter_form):
+def fill_form(driver, filter_form, pages=None):
     logging.info("Filling filter form...")
+    pages = pages or EFilingPages(driver)
+
     for filter in filter_form:
         form_type = filter['type']
         form = filter['form']
-        input_item = filter['item']
+        item = filter['item']
 
-        if input_item is None or input_item == "" or input_item == np.nan:
+        # NaN is the only value not equal to itself, checked without importing numpy
+        if item is None or item == "" or item != item:
             continue
 
         if form_type == 'dropdown':
-            select_dropdown_item(driver, form, input_item)
+            select_dropdown_item(driver, form, item, pages=pages)
         elif form_type == 'input':
-            input_item(driver, form, input_item)
+            input_item(driver, form, item, pages=pages)
         else:
             continue
     
     # Click search button
     try:
-        search_button = find_element_with_retry(driver, (By.XPATH, "//button[@type='submit']"))
-        click_element_with_retry(driver, search_button)
+        pages.filter.search()
     except Exception as e:
         logging.error(f"Failed to click search button: {e}")
 
-def convert_thai_month_to_eng(tax_month):
-    """Convert Thai month abbreviation to English."""
-    logging.info("Converting Thai's month into Eng")
-    thai_to_eng_month = {
-        "ม.ค.": "JAN",
-        "ก.พ.": "FEB",
-        "มี.ค.": "MAR",
-        "เม.ย.": "APR",
-        "พ.ค.": "MAY",
-        "มิ.ย.": "JUN",
-        "ก.ค.": "JUL",
-        "ส.ค.": "AUG",
-        "ก.ย.": "SEP",
-        "ต.ค.": "OCT",
-        "พ.ย.": "NOV",
-        "ธ.ค.": "DEC"
-    }
-
-    # Check if the provided tax_month is None
-    if tax_month is None:
-        return "MONTH"
-
-    # Check if the provided tax_month is in the list of prohibited names
-    if tax_month in thai_to_eng_month:
-        logging.info("Converting Thai's month into Eng")
-        return thai_to_eng_month[tax_month]
-    else:
-        logging.info("Tax month not found in the list")
-        return tax_month
-
-def convert_thai_tax_form_to_eng(tax_form):
-    """Convert Thai tax form abbreviation to English."""
-    logging.info("Converting Thai's tax form into Eng")
-    thai_to_eng_tax_form = {
-        "ภ.ง.ด.1": "PND1",
-        "ภ.ง.ด.2": "PND2",
-        "ภ.ง.ด.3": "PND3",
-        "ภ.ง.ด.53": "PND53",
-        "ภ.ง.ด.90": "PND90",
-        "ภ.ง.ด.91": "PND91",
-        "ภ.ง.ด.93": "PND93",
-        "ภ.ง.ด.94": "PND94",
-        "ภ.ง.ด.96": "PND96",
-        "ภ.ง.ด.97": "PND97",
-        "ภ.ง.ด.98": "PND98",
-        "ภ.ง.ด.99": "PND99",
-        "ภ.ง.ด.1ก": "PND1KOR",
-        "ภ.ง.ด.2ก": "PND2KOR",
-        "ภ.ง.ด.3ก": "PND3KOR",
-        "ภ.ง.ด.53ก": "PND53KOR",
-        "ภ.ง.ด.90ก": "PND90KOR",
-        "ภ.ง.ด.91ก": "PND91KOR",
-        "ภ.ง.ด.91 (นายจ้างยื่นแทน)": "PND91KOR EMPLOYER",
-        "ภ.ง.ด.93ก": "PND93KOR",
-        "ภ.ง.ด.94ก": "PND94KOR",
-        "ภ.ง.ด.96ก": "PND96KOR",
-        "ภ.ง.ด.97ก": "PND97KOR",
-        "ภ.ง.ด.98ก": "PND98KOR",
-        "ภ.ง.ด.99ก": "PND99KOR",
-        "ภ.พ.30": "PP30",
-        "ภ.พ.36": "PP36",
-        "ภ.ธ.40": "PP40",
-        "งบการเงิน": "FinancialStatement",
-        "แบบแจ้งเงินได้ต่างด้าว": "FORIEGNINCOME",
-    }
-
-    if tax_form == None or tax_form == "":
-        return ""
-
-    # Check if the provided tax_form is in the list of prohibited names
-    if tax_form in thai_to_eng_tax_form:
-        logging.info("Converting Thai's tax form into Eng")
-        return thai_to_eng_tax_form[tax_form]
-    else:
-        logging.info("Tax form not found in the list")
-        return tax_form
-
-def convert_system_tax_form_to_eng(tax_form):
-    """Convert Thai tax form abbreviation to English."""
-    logging.info("Converting Thai's tax form into Eng")
-    thai_to_eng_tax_form = {
-        "P01": "PND1",
-        "P02": "PND2",
-        "P03": "PND3",
-        "P50": "PND50",
-        "P51": "PND51",
-        "P52": "PND52",
-        "P53": "PND53",
-        "P54": "PND54",
-        "P55": "PND55",
-        "P90": "PND90",
-        "P91": "PND91",
-        "P93": "PND93",
-        "P94": "PND94",
-        "P96": "PND96",
-        "P97": "PND97",
-        "P98": "PND98",
-        "P99": "PND99",
-        "P1A": "PND1A",
-        "P2A": "PND2A",
-        "P3A": "PND3A",
-        "P53A": "PND53A",
-        "P90A": "PND90A",
-        "P91A": "PND91A",
-        "P91E": "PND91E",
-        "P93A": "PND93A",
-        "P94A": "PND94A",
-        "P96A": "PND96A",
-        "P97A": "PND97A",
-        "P98A": "PND98A",
-        "P99A": "PND99A",
-        "P30": "PP30",
-        "P36": "PP36",
-        "P40": "PT40",
-    }
-    
-    # Check if the provided tax_form is in the list of prohibited names
-    if tax_form in thai_to_eng_tax_form:
-        logging.info("Converting Thai's tax form into Eng")
-        return thai_to_eng_tax_form[tax_form]
-    else:
-        logging.info("Tax form not found in the list")
-        return "TAX_FORM"
-
-def convert_thai_year_to_eng(tax_year):
-    """
-    Convert Thai year to English year.
-
-    Args:
-        tax_year (str): Thai year in the format "2567".
-
-    Returns:
-        str: English year in the format "2024".
-    """
-    logging.info("Converting Thai year to English year")
-
-    if (tax_year is None) or (tax_year == ""):
-        return "YEAR"
-
-    eng_year = int(tax_year) - 543
-    return str(eng_year)
-
-def split_tax_form(tax_form, url_extr):
-    """
-    Split tax form from URL.
-
-    Args:
-        tax_form (str): Tax form from filter form.
-        url_extr (str): Extracted tax form from URL.
-
-    Returns:
-        str: Tax form.
-    """
-    logging.info("Splitting tax form from URL")
-
-    try:
-        tax_name_index = url_extr.index(tax_form) + len(tax_form)
-    except ValueError:
-        logging.warning("Tax form not found in URL")
-        return "UNKNOWN"
-
-    return convert_system_tax_form_to_eng(url_extr[tax_name_index:tax_name_index + 3])
-
-def get_file_name(driver, filter_form, username, download_directory, max_button, button_counter):
+def get_file_name(driver, filter_form, username, download_directory, max_button, button_counter, output=None):
     """
     Constructing a file name with the URL.
 
@@ -572,54 +301,24 @@ def get_file_name(driver, filter_form, username, download_directory, max_button,
         filter_form: Dictionary containing filter information.
         username: Username for the current user.
         download_directory: Directory where files will be downloaded.
+        output: Output backend used to reserve the file name, loose files by default.
 
     Returns:
         str: File name.
     """
     try:
-        logging.info("Getting download filename...")
-
-        # Extract filter information
-        tax_name = filter_form[0]['item']
-        tax_year = filter_form[1]['item']
-        tax_month = filter_form[2]['item']
-
-        # Convert Thai filter information to English
-        tax_name = convert_thai_tax_form_to_eng(tax_name)
-        tax_year = convert_thai_year_to_eng(tax_year)
-        tax_month = convert_thai_month_to_eng(tax_month).upper()
+        base_filename = base_file_name(driver.current_url, filter_names(filter_form), username, max_button, button_counter)
 
-        current_url = driver.current_url
-        url_extr = current_url.split('/')[-1]  # Extract filename from URL
-
-        # Construct base filename
-        if "RECEIPT" in url_extr:
-            tax_name = split_tax_form("RECEIPT_", url_extr)
-
-            if max_button > 3 and button_counter == 2:
-                base_filename = f"RECEIPT_POR.2 - PENALTY FEE {tax_name} {tax_month}-{tax_year} {username}.pdf"
-            else:
-                base_filename = f"RECEIPT_{tax_name} {tax_month}-{tax_year} {username}.pdf"
-
-        elif "TAX_FORM" in url_extr:
-            tax_name = split_tax_form("TAX_FORM_", url_extr)
-            base_filename = f"{tax_name} {tax_month}-{tax_year} {username}.pdf"
-        elif "C02" in url_extr:
-            tax_name = split_tax_form("C02_", url_extr)
-            base_filename = f"POR.2 - PENALTY FEE {tax_name} {tax_month}-{tax_year} {username}.pdf"
-        else:
-            base_filename = f"UNKNOWN_{tax_name} {tax_month}-{tax_year} {username}.pdf"
-
-        # Check if the base filename already exists
+        # Reserve the first free filename, atomically so hosts sharing the folder never collide
+        if output is None:
+            output = FolderOutput()
         filename = base_filename
         index = 1
-        while os.path.exists(os.path.join(download_directory, filename)):
-            logging.info("Base filename already exists, finding next available filename...")
-            filename = f"{base_filename[:-4]} {index}.pdf"  # Append _{index} before the extension
+        while not output.reserve(download_directory, filename):
+            filename = numbered_file_name(base_filename, index)
             index += 1
 
         logging.info(f"Final filename: {filename}")
-        logging.info("Filename creation successful")
         return filename
     
     except Exception as e:
@@ -652,7 +351,7 @@ def download_pdf(driver, download_directory, filename=None):
         filename: Name of the downloaded file.
 
     Returns:
-        None
+        str: Path of the saved file, or None if the download failed.
     """
     logging.info("Attemp downloading PDF...")
     attempt = 0
@@ -689,9 +388,10 @@ def download_pdf(driver, download_directory, filename=None):
 
         try:
             logging.info("Retrieve PDF URL for downloading")
-            urllib.request.urlretrieve(current_url, saved_directory)
+            # Bounded by a timeout, the watchdog only kills the browser and cannot end a stalled transfer
+            fetch_url(current_url, saved_directory)
             logging.info(f"PDF downloaded successfully to: {saved_directory}")
-            return  # Exit the function after successful download
+            return saved_directory  # Exit the function after successful download
         except Exception as e:
             logging.warning(f"Failed to download PDF: {e}")
             attempt += 1
@@ -700,50 +400,59 @@ def download_pdf(driver, download_directory, filename=None):
         attempt += 1
 
     logging.error("Failed to download PDF after multiple attempts")
+    return None
 
 
-def get_month_index(month):
-    """Get month index."""
-    month_index = {
-        "JAN": 1,
-        "FEB": 2,
-        "MAR": 3,
-        "APR": 4,
-        "MAY": 5,
-        "JUN": 6,
-        "JUL": 7,
-        "AUG": 8,
-        "SEP": 9,
-        "OCT": 10,
-        "NOV": 11,
-        "DEC": 12
-    }
-    return month_index[month]
-
-
-def construct_download_directory(download_directory, company_name, tax_year, tax_month):
-    """Construct download directory."""
-    logging.info("Constructing download directory...")
-    try:
-        logging.info("Formatting destination path")
-        destination = [company_name, f"YEAR {tax_year}", f"{get_month_index(tax_month)}.{tax_month}-{tax_year}"]
-        destination = "/".join(destination)
-        logging.info(f"Destination path formatted successfully: {destination}")
-    except Exception as e:
-        logging.error("Error formatting directory path: %s", e)  # Print specific error message
+def wait_for_new_tab(driver, known_handles):
+    """Wait for a tab opened by the last click and return its handle."""
+    new_handles = WebDriverWait(driver, WAIT_TIMEOUT).until(lambda d: set(d.window_handles) - known_handles)
+    return new_handles.pop()
 
-    try:
-        logging.info("Joining destination folder with download directory")
-        final_directory = os.path.join(download_directory, destination)
-        logging.info(f"Path constructed successfully: {final_directory}")
-    except Exception as e:
-        logging.error("Error joining destination folder: %s", e)  # Print specific error message
+def store_downloaded_file(output, directory, filename, staged_path, metadata, validation_result=None, catalog=None, extractor=None):
+    """
+    Hand a downloaded file to the output backend, called directly or once validation passes.
 
-    return final_directory
+    The stored file is then added to the catalog and queued for text extraction, when they are enabled.
+    """
+    if catalog is None and extractor is None:
+        return output.commit(directory, filename, staged_path, metadata)
+
+    # Hash before committing, archive backends remove the staged file
+    size, sha256 = file_digest(staged_path)
+    metadata = dict(metadata, size=size, sha256=sha256)
+    location = output.commit(directory, filename, staged_path, metadata)
+    if catalog is not None:
+        try:
+            catalog.add(location, metadata)
+        except Exception as e:
+            logging.error("Failed to add %s to the catalog: %s", location, e)
+    if extractor is not None:
+        extractor.submit(location, metadata)
+    return location
+
+def reject_downloaded_file(output, directory, filename, staged_path, metadata, validation_result=None):
+    """Hand a file that failed validation to the output backend, which keeps it out of the stored files."""
+    location = output.reject(directory, filename, staged_path, metadata)
+    logging.error(f"Rejected invalid PDF kept at {location}")
+    return location
+
+def find_and_download_pdf(driver, filter_form, username, company_name, download_directory, validator=None, output=None, pages=None, observers=None, catalog=None, extractor=None):
+    """Find and download PDF, storing each file through the output backend once it has been validated."""
+    for _ in download_results_steps(driver, filter_form, username, company_name, download_directory, validator=validator, output=output, pages=pages, observers=observers, catalog=catalog, extractor=extractor):
+        pass
+
+def download_results_steps(driver, filter_form, username, company_name, download_directory, validator=None, output=None, pages=None, observers=None, catalog=None, extractor=None):
+    """
+    Download every PDF of the results page, one step per resume.
 
-def find_and_download_pdf(driver, filter_form, username, company_name, download_directory):
-    """Find and download PDF."""
+    Yields whenever the browser is busy after a click: once a row's print menu
+    is opened and once each PDF tab has opened. TabScheduler works in other tabs
+    meanwhile, find_and_download_pdf just carries on.
+    """
     logging.info("Finding and downloading PDF...")
+    if output is None:
+        output = FolderOutput()
+
     tax_name = filter_form[0]['item']
     tax_year = filter_form[1]['item']
     tax_month = filter_form[2]['item']
@@ -752,37 +461,43 @@ def find_and_download_pdf(driver, filter_form, username, company_name, download_
     tax_year = str(convert_thai_year_to_eng(tax_year))
 
     final_directory = construct_download_directory(download_directory, company_name, tax_year, tax_month)
+    staging_directory = output.staging_directory(final_directory)
 
+    pages = pages or EFilingPages(driver)
+    # Tab showing the results, other tabs of the browser may belong to other periods
+    home_tab = driver.current_window_handle
     last_clicked_index = 0
     attempts = 0
             
     while attempts < MAX_ATTEMPTS:
-
-        button_elements = find_all_elements_with_retry(driver, (By.XPATH, '//button[@aria-controls="dropdown-basic" and @id="button-basic"]'))
-        if not button_elements:
+        try:
+            button_elements = pages.results.row_buttons()
+        except Exception as e:
             press_esc_with_retry(driver)
-            logging.error("Failed to find dropdown button")
+            logging.error(f"Failed to find dropdown button: {e}")
+            pages.results.invalidate()
             attempts += 1
             continue
 
         if last_clicked_index + 1 > len(button_elements):
             break
 
-        click_element_with_retry(driver, button_elements[last_clicked_index], fallback_locator=(By.XPATH, '//button[@aria-controls="dropdown-basic" and @id="button-basic"]'), index=last_clicked_index)
-
-        dropdown_menu = find_clickable_with_retry(driver, (By.XPATH, '//a[@class="dropdown-item" and contains(text(), "พิมพ์ภาพแบบ/ภาพใบเสร็จ")]'))
-        if not dropdown_menu:
+        try:
+            pages.results.open_print_menu(last_clicked_index)
+        except Exception as e:
             press_esc_with_retry(driver)
-            logging.error("Failed to find dropdown item")
+            logging.error(f"Failed to open print menu: {e}")
+            pages.results.invalidate()
             attempts += 1
             continue
+        # The download modal opens while other tabs work
+        yield "download", 0
 
-        click_element_with_retry(driver, dropdown_menu)
-
-        download_buttons = find_all_elements_with_retry(driver, (By.XPATH, '//button[contains(text(), "ดาวน์โหลด")]'))
-        if not download_buttons:
+        try:
+            download_buttons = pages.modal.download_buttons()
+        except Exception as e:
             press_esc_with_retry(driver)
-            logging.error("Failed to find download buttons")
+            logging.error(f"Failed to find download buttons: {e}")
             attempts += 1
             continue
 
@@ -795,78 +510,94 @@ def find_and_download_pdf(driver, filter_form, username, company_name, download_
             if click_button_attempts > MAX_ATTEMPTS:
                 break
 
-            download_button = download_buttons[button_counter]
-
+            pdf_tab = None
+            tab_closed = True
             try:
-                click_element_with_retry(driver, download_button)
+                known_tabs = set(driver.window_handles)
+                pages.modal.download(button_counter)
                 logging.info("Switching to new tab")
-                tabs = driver.window_handles
-                driver.switch_to.window(tabs[-1])
-                logging.info("Joining destination to filename")
-                filename = os.path.join(final_directory, get_file_name(driver, filter_form, company_name, final_directory, max_button, button_counter))
-                logging.info(f"Filename joined successfully: {filename}")
-                download_pdf(driver, final_directory, filename=filename)
+                pdf_tab = wait_for_new_tab(driver, known_tabs)
+                # The PDF loads while other tabs work. Its tab is already known, so tabs
+                # opened by other downloads meanwhile are never mistaken for it.
+                yield "download", 0
+                driver.switch_to.window(pdf_tab)
+                url = driver.current_url
+                # A retried job opens every file of the period again, keep the copy stored by the earlier attempt
+                if catalog is not None and catalog.has_url(url):
+                    logging.info(f"Already stored, skipping: {url}")
+                else:
+                    logging.info("Joining destination to filename")
+                    base_name = get_file_name(driver, filter_form, company_name, final_directory, max_button, button_counter, output=output)
+                    filename = os.path.join(staging_directory, base_name)
+                    logging.info(f"Filename joined successfully: {filename}")
+                    saved_path = download_pdf(driver, staging_directory, filename=filename)
+                    if saved_path:
+                        notify_file_downloaded(observers, saved_path)
+                        kind, form_code, penalty = classify_download(url, max_button, button_counter)
+                        metadata = {'username': username, 'company_name': company_name, 'tax_form': tax_name, 'tax_year': tax_year, 'tax_month': tax_month, 'button_index': button_counter,
+                                    'kind': kind, 'form_code': form_code, 'penalty': penalty, 'url': url}
+                        store_file = functools.partial(store_downloaded_file, output, final_directory, base_name, saved_path, metadata, catalog=catalog, extractor=extractor)
+                        if validator is not None:
+                            reject_file = functools.partial(reject_downloaded_file, output, final_directory, base_name, saved_path, metadata)
+                            validator.submit(url, saved_path, metadata, on_valid=store_file, on_invalid=reject_file)
+                        else:
+                            store_file()
+                    else:
+                        output.release(final_directory, base_name)
             except Exception as e:
                 logging.error("Error during PDF download process: %s", e)
                 click_button_attempts += 1
-                driver.close()  # Close the tab
                 continue
             finally:
                 try:
-                    driver.close()
-                    driver.switch_to.window(tabs[0])
+                    # Close only the PDF tab, never the results tab
+                    if pdf_tab is not None:
+                        driver.switch_to.window(pdf_tab)
+                        driver.close()
+                    driver.switch_to.window(home_tab)
                 except Exception as e:
                     logging.error("Error closing or switching tab: %s", e)
                     click_button_attempts += 1
-                    continue
+                    tab_closed = False
 
+            # Not a continue inside finally, it would swallow the exit of a closed generator
+            if not tab_closed:
+                continue
             button_counter += 1
 
-        close_button = find_clickable_with_retry(driver, (By.XPATH, '//button[contains(@class, "btn button-box button-box-close-modal") and contains(text(), "ปิด")]'))
-        if not close_button:
-            logging.error("Failed to find close button")
-            press_esc_with_retry(driver)
-            logging.info("Trying to press ESC key")
-            attempts += 1
-            continue
-
         try:
-            click_element_with_retry(driver, close_button)
+            pages.modal.close()
         except Exception as e:
             logging.error("Failed to click on close button: %s", e)
             press_esc_with_retry(driver)
             logging.info("Trying to press ESC key")
+            pages.modal.invalidate()
             attempts += 1
             continue
 
         logging.info(f"Current button click counting: {last_clicked_index}")
         last_clicked_index += 1
 
-def switch_to_next_page(driver):
+def switch_to_next_page(driver, pages=None):
     """Switch to the next page in the same URL."""
     logging.info("Switching to next page...")
+    pages = pages or EFilingPages(driver)
     try:
-        next_page_button = find_clickable_with_retry(driver, (By.XPATH, '//li[@title="หน้าถัดไป"]'))   
-    except Exception as e:
-        logging.error("Failed to switch to next page: %s", e)
-        return False
-
-    try:
-        if "disabled" not in next_page_button.get_attribute("class"):
-            logging.info(f'Next page class containing: {next_page_button.get_attribute("class")}')
-            click_element_with_retry(driver, next_page_button)
+        if pages.results.next_page():
             return True
-        else:
-            logging.info("No more pages to switch to")
-            return False
+        logging.info("No more pages to switch to")
+        return False
     except Exception as e:
-        logging.error("Failed to click next page: %s", e)
+        logging.error("Failed to switch to next page: %s", e)
         return False
 
 def logout(driver):
     """Logout from the site."""
     logging.info("Logging out...")
 
+    # Remember the browser processes, quit() does not always take them down
+    browser_pids = browser_process_tree(driver)
+
     attemp = 0
     while attemp < MAX_ATTEMPTS:
 
@@ -878,42 +609,214 @@ def logout(driver):
             attemp += 1
             logging.error("Failed to logout: %s", e)
 
+    # Kill whatever is still running after quit
+    reap_processes(browser_pids)
+    forget_browsers(browser_pids)
+
+
+def job_label(username, filter_form):
+    """Short label of an account and period, used in reports and profile file names."""
+    tax_month = convert_thai_month_to_eng(filter_form[2]['item'])
+    tax_year = convert_thai_year_to_eng(filter_form[1]['item'])
+    return f"{username} {tax_month}-{tax_year}"
+
+def write_metrics(metrics, path, extra):
+    """Log a job's WebDriver command summary and append it to the metrics report."""
+    summary = metrics.summary()
+    logging.info(f"WebDriver commands for {metrics.label}: {summary['commands']} in {summary['command_seconds']:.1f}s, by group: {summary['by_group']}")
+    try:
+        metrics.write(path, extra)
+    except Exception as e:
+        logging.error("Failed to write WebDriver metrics: %s", e)
 
 # Main controller
-def login_and_download_all_pdfs(username, password, company_name, login_url, filter_form, download_directory):
+def login_and_download_all_pdfs(username, password, company_name, login_url, filter_form, download_directory, validator=None, output=None, observers=None, catalog=None, extractor=None):
     
+    # Page objects keep element handles cached for the whole session
+    pages = EFilingPages()
+
+    # Count and time every WebDriver command of this job, per phase
+    metrics = DriverMetrics(job_label(username, filter_form))
+    observers = [metrics] + list(observers or [])
+
+    # A failed login raises, so the job goes back to the queue instead of being marked done
     try:
-        driver = login(username, password, login_url)
+        with job_phase(observers, "login"):
+            driver = login(username, password, login_url, pages=pages, observers=observers)
     except Exception as e:
         logging.error("Failed to login: %s", e)
-        return
+        raise
+    if driver is None:
+        raise RuntimeError(f"Failed to login as {username}")
    
     try:
-        navigate_to_pdf_page(driver)
+        with job_phase(observers, "navigate"):
+            navigate_to_pdf_page(driver)
         
-        # Open filter panel
-        open_filter_panel(driver)
+        with job_phase(observers, "filter"):
+            # Open filter panel
+            open_filter_panel(driver, pages=pages)
 
-        # Fill filter form
-        fill_form(driver, filter_form)
+            # Fill filter form
+            fill_form(driver, filter_form, pages=pages)
 
-        # Wait for page to load
-        time.sleep(2)
+            # Wait for page to load
+            time.sleep(2)
             
         # Download pdfs from every items shown in the page
         while True:
-            find_and_download_pdf(driver, filter_form, username, company_name, download_directory)
-            if (not switch_to_next_page(driver)):
-                break
+            with job_phase(observers, "download"):
+                find_and_download_pdf(driver, filter_form, username, company_name, download_directory, validator=validator, output=output, pages=pages, observers=observers, catalog=catalog, extractor=extractor)
+            with job_phase(observers, "next_page"):
+                if (not switch_to_next_page(driver, pages=pages)):
+                    break
 
         time.sleep(5)
 
     finally:
-        logout(driver)
+        with job_phase(observers, "logout"):
+            logout(driver)
+        write_metrics(metrics, os.path.join(download_directory, METRICS_REPORT_FILENAME), {'username': username, 'company_name': company_name})
+
+def download_period_steps(driver, filter_form, username, company_name, download_directory, pages, validator=None, output=None, observers=None, catalog=None, extractor=None):
+    """
+    Download one period in the current tab, one step per resume.
+
+    Yields the phase of the next step and the seconds to wait before it, so
+    TabScheduler can work in other tabs while this one waits on the server.
+    """
+    navigate_to_pdf_page(driver)
+    yield "filter", 0
+
+    open_filter_panel(driver, pages=pages)
+    fill_form(driver, filter_form, pages=pages)
+    # Search results load while other tabs work
+    yield "download", TIME_SLEEP
+
+    while True:
+        yield from download_results_steps(driver, filter_form, username, company_name, download_directory, validator=validator, output=output, pages=pages, observers=observers, catalog=catalog, extractor=extractor)
+        yield "next_page", 0
+        if not switch_to_next_page(driver, pages=pages):
+            break
+        yield "download", 0
+
+def lease_guarded(steps, lease):
+    """Stop the steps of a tab once its job's lease is lost, the browser is shared so it cannot be killed."""
+    try:
+        for step in steps:
+            yield step
+            lease.raise_if_lost()
+    finally:
+        steps.close()
+
+def run_tabbed_session(queue, job, password, login_url, download_directory, worker_id, tabs=TABS, validator=None, output=None, progress=None, catalog=None, extractor=None):
+    """
+    Run periods of one account in several tabs of a single logged-in browser.
+
+    The given job is already claimed. The other tabs claim pending jobs of the
+    same account, and a tab that finishes a job claims the next one. Every job is
+    completed or handed back to the queue here. A tab whose job failed is not
+    used again, and after a watchdog timeout no new jobs are claimed.
+
+    Args:
+        queue: InMemoryJobQueue or SQLiteJobQueue instance.
+        job: Claimed job whose account is logged in.
+        password: Password of the job's account.
+        tabs: Maximum number of tabs working at the same time.
+
+    Returns:
+        None
+    """
+    username = job['username']
+    # Login, logout and tab switches, each job's own commands go to its metrics
+    metrics = DriverMetrics(f"{username} ({tabs} tabs)")
+    metrics_path = os.path.join(download_directory, METRICS_REPORT_FILENAME)
+    driver = None
+
+    with JobWatchdog() as watchdog:
+        session_observers = [metrics, watchdog]
+
+        def start_job(claimed, handle, tab_index):
+            tab_id = f"{worker_id}/tab{tab_index}"
+            leases = contextlib.ExitStack()
+            lease = leases.enter_context(LeaseKeeper(queue, claimed['job_id'], worker_id))
+            job_metrics = DriverMetrics(job_label(username, claimed['filter_form']), session=metrics)
+            observers = [job_metrics, watchdog]
+            if progress is not None:
+                progress.job_started(tab_id, job_label(username, claimed['filter_form']))
+                observers.append(progress.observer(tab_id))
+            logging.info(f"Tab {tab_index} running job {claimed['job_id']}, attempt {claimed['attempt']}")
+            steps = download_period_steps(driver, claimed['filter_form'], username, claimed['company_name'], download_directory, EFilingPages(driver),
+                                          validator=validator, output=output, observers=observers, catalog=catalog, extractor=extractor)
+            steps = lease_guarded(steps, lease)
+            return TabTask(handle, steps, "navigate", observers=observers,
+                           context={'job': claimed, 'lease': lease, 'leases': leases, 'metrics': job_metrics, 'tab_id': tab_id, 'tab_index': tab_index})
+
+        def finish_job(task, error):
+            claimed = task.context['job']
+            task.context['leases'].close()
+            if error is None and watchdog.expired:
+                error = JobTimeout(watchdog.expired)
+            if error is None:
+                try:
+                    task.context['lease'].raise_if_lost()
+                except LeaseLost as e:
+                    error = e
+            if error is None:
+                queue.complete(claimed['job_id'], worker_id)
+                watchdog.extend()
+            else:
+                logging.error(f"Job {claimed['job_id']} failed: {error}")
+                queue.fail(claimed['job_id'], worker_id, error)
+            if progress is not None:
+                progress.job_finished(task.context['tab_id'], error is None)
+            write_metrics(task.context['metrics'], metrics_path, {'username': username, 'company_name': claimed['company_name'], 'tabs': tabs, 'tab': task.context['tab_index']})
+            if error is not None:
+                return None
+
+            next_job = queue.claim(worker_id, username=username)
+            if next_job is None:
+                return None
+            return start_job(next_job, task.handle, task.context['tab_index'])
+
+        scheduler = None
+        try:
+            with job_phase(session_observers, "login"):
+                driver = login(username, password, login_url, observers=session_observers)
+            if driver is None:
+                raise RuntimeError(f"Failed to login as {username}")
+
+            scheduler = TabScheduler(driver, finish_job)
+            scheduler.add(start_job(job, driver.current_window_handle, 0))
+            for tab_index in range(1, tabs):
+                claimed = queue.claim(worker_id, username=username)
+                if claimed is None:
+                    break
+                driver.switch_to.new_window('tab')
+                scheduler.add(start_job(claimed, driver.current_window_handle, tab_index))
+
+            scheduler.run()
+        except Exception as e:
+            logging.error(f"Tabbed session of {username} failed: {e}")
+            if scheduler is None:
+                queue.fail(job['job_id'], worker_id, e)
+            else:
+                # Jobs still in their tabs go back to the queue without claiming new ones
+                for task in list(scheduler.tasks):
+                    scheduler.tasks.remove(task)
+                    finish_job(task, e)
+        finally:
+            if driver is not None:
+                with job_phase(session_observers, "logout"):
+                    logout(driver)
+            write_metrics(metrics, metrics_path, {'username': username, 'tabs': tabs, 'session': True})
 
 def main():
     setup_debug_logging()
 
+    # Browsers left behind by crashed workers on this host hold memory and may keep sessions open
+    reap_orphaned_browsers()
+
     # Months in Thai
     thai_months = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
 
@@ -925,8 +828,62 @@ def main():
     user_download_folder = os.path.join(os.path.expanduser('~'), 'Downloads').replace('\\', '/')
     DEFAULT_DOWNLOAD_DIRECTORY = f"{user_download_folder}/EFillingController"
 
-    login_url = "https://efiling.rd.go.th/rd-efiling-web/login"
+    login_url = LOGIN_URL
+
+    # Validate downloaded PDFs in the background while the browser keeps working
+    validator = None
+    if VALIDATE_DOWNLOADS:
+        validator = PdfValidationQueue(report_path=os.path.join(DEFAULT_DOWNLOAD_DIRECTORY, "validation_report.jsonl"))
+
+    # Loose files by default, or one ZIP/tar archive per company and period
+    output = create_output(OUTPUT_BACKEND, DEFAULT_DOWNLOAD_DIRECTORY)
+
+    # Index every stored file for lookups and gap reports, see catalog.py
+    catalog = FilingsCatalog(os.path.join(DEFAULT_DOWNLOAD_DIRECTORY, CATALOG_FILENAME))
+
+    # Optionally extract tax data from stored PDFs in low priority worker processes
+    extractor = None
+    if EXTRACT_TEXT:
+        extractor = PdfExtractionQueue(os.path.join(DEFAULT_DOWNLOAD_DIRECTORY, "extracted"))
+
+    # Share jobs with workers on other hosts through a SQLite file, or keep them in this process
+    if JOB_QUEUE_PATH:
+        queue = SQLiteJobQueue(JOB_QUEUE_PATH)
+    else:
+        queue = InMemoryJobQueue()
+
+    # Every host of a run enqueues the same jobs, duplicates are ignored by job key. Jobs
+    # finished or given up in an earlier run are only queued again for a new run: one
+    # named by EFILLING_RUN_ID, or when nothing is pending or running. A worker
+    # started without a run id next to running workers joins their run.
+    run_id = RUN_ID
+    if run_id is None:
+        counts = queue.counts()
+        if counts['pending'] == 0 and counts['running'] == 0:
+            run_id = new_run_id()
+    added = sum(queue.put(job, run_id=run_id) for job in generate_jobs(accounts, options, thai_months))
+    logging.info(f"Added {added} jobs to the queue: {queue.counts()}")
+
+    # Progress and ETA in the activity log, and as JSON when EFILLING_STATUS_PORT is set
+    progress = ProgressTracker(queue).start()
 
+    try:
+        run_worker(queue, accounts, login_url, DEFAULT_DOWNLOAD_DIRECTORY, validator=validator, output=output, progress=progress, catalog=catalog, extractor=extractor)
+    finally:
+        progress.close()
+        if validator is not None:
+            validator.close()
+        # Validated files are stored while the validator closes, extract them before stopping
+        if extractor is not None:
+            extractor.close()
+        output.close()
+
+def make_job(account, filter_form):
+    """Create a job for one account and period. Passwords stay out of the job and are looked up by each worker."""
+    return {'username': account['username'], 'company_name': account['company_name'], 'filter_form': [dict(item) for item in filter_form]}
+
+def generate_jobs(accounts, options, thai_months):
+    """Yield one job for every account and period selected in the options."""
     for account in accounts:
         # Prepare filter form data
         filter_form = [
@@ -946,21 +903,93 @@ def main():
                 filter_form[1]['item'] = str(year)
                 for month in thai_months:
                     filter_form[2]['item'] = month
-                    login_and_download_all_pdfs(account['username'], account['password'], account['company_name'], login_url, filter_form, DEFAULT_DOWNLOAD_DIRECTORY)
+                    yield make_job(account, filter_form)
         # Check if selectYear is not specified
         elif not options[0]['tax_year']:
             for month in thai_months:
                 filter_form[2]['item'] = month
-                login_and_download_all_pdfs(account['username'], account['password'], account['company_name'], login_url, filter_form, DEFAULT_DOWNLOAD_DIRECTORY)
+                yield make_job(account, filter_form)
         # Check if selectMonth is not specified
         elif not options[0]['tax_month']:
             for year in thai_months:
                 filter_form[1]['item'] = year
-                login_and_download_all_pdfs(account['username'], account['password'], account['company_name'], login_url, filter_form, DEFAULT_DOWNLOAD_DIRECTORY)
+                yield make_job(account, filter_form)
+        else:
+            yield make_job(account, filter_form)
+
+def run_worker(queue, accounts, login_url, download_directory, validator=None, output=None, worker_id=None, progress=None, catalog=None, extractor=None):
+    """
+    Claim jobs from the queue and run them until no job is pending or running.
+
+    While a job runs, a background thread renews its lease and a watchdog kills
+    the browser once the job or one of its phases runs past its deadline. A job
+    that raises or times out is handed back to the queue for another attempt. A
+    job whose lease was taken over by another worker is stopped by killing its
+    browser. When other workers still hold leases, this worker keeps polling so it can pick up jobs whose worker died.
+
+    Args:
+        queue: InMemoryJobQueue or SQLiteJobQueue instance.
+        accounts: Credentials read from the credentials file.
+        login_url: URL for login page.
+        download_directory: Root directory for downloaded PDFs.
+        validator: Optional PdfValidationQueue for downloaded files.
+        output: Optional output backend.
+        worker_id: Identifier of this worker, unique across hosts by default.
+        progress: Optional ProgressTracker told about every job, phase and file.
+        catalog: Optional FilingsCatalog updated with every stored file.
+        extractor: Optional PdfExtractionQueue for stored files.
+
+    Returns:
+        None
+    """
+    worker_id = worker_id or default_worker_id()
+    passwords = {account['username']: account['password'] for account in accounts}
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            counts = queue.counts()
+            if counts['pending'] == 0 and counts['running'] == 0:
+                logging.info(f"Worker {worker_id} found no more jobs: {counts}")
+                break
+            time.sleep(QUEUE_POLL_INTERVAL)
+            continue
+
+        if TABS > 1 and job['username'] in passwords:
+            # The session completes or fails this job and the others it runs in its tabs
+            profile_base = os.path.join(download_directory, "profiles", f"{job['username']} tabs")
+            profile_call(PROFILE_MODE, profile_base, run_tabbed_session, queue, job, passwords[job['username']], login_url, download_directory, worker_id,
+                         validator=validator, output=output, progress=progress, catalog=catalog, extractor=extractor)
+            continue
+
+        logging.info(f"Worker {worker_id} running job {job['job_id']}, attempt {job['attempt']}")
+        if progress is not None:
+            progress.job_started(worker_id, job_label(job['username'], job['filter_form']))
+        try:
+            if job['username'] not in passwords:
+                raise KeyError(f"No credentials for {job['username']} on this host")
+            with JobWatchdog() as watchdog, LeaseKeeper(queue, job['job_id'], worker_id, on_lost=lambda: watchdog.abort("lease lost")) as lease:
+                observers = [watchdog] if progress is None else [watchdog, progress.observer(worker_id)]
+                # Optionally profile the whole job, one report per account and period
+                profile_base = os.path.join(download_directory, "profiles", job_label(job['username'], job['filter_form']))
+                profile_call(PROFILE_MODE, profile_base, login_and_download_all_pdfs, job['username'], passwords[job['username']], job['company_name'], login_url, job['filter_form'], download_directory, validator=validator, output=output, observers=observers, catalog=catalog, extractor=extractor)
+            # Another worker owns the job once its lease is lost, stop without marking it done
+            lease.raise_if_lost()
+            # A killed browser makes the job end early, retry it instead of marking it done
+            watchdog.raise_if_expired()
+        except Exception as e:
+            logging.error(f"Job {job['job_id']} failed: {e}")
+            queue.fail(job['job_id'], worker_id, e)
+            succeeded = False
         else:
-            login_and_download_all_pdfs(account['username'], account['password'], account['company_name'], login_url, filter_form, DEFAULT_DOWNLOAD_DIRECTORY)
+            queue.complete(job['job_id'], worker_id)
+            succeeded = True
+        if progress is not None:
+            progress.job_finished(worker_id, succeeded)
 
 if __name__ == "__main__":
+    # Required for the validation process pool in the frozen executable
+    multiprocessing.freeze_support()
     main()
 
 
@@ -10,7 +10,8 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # pandas is only a lazy fallback for legacy .xls inputs, keep it and its stack out of the build
+    excludes=['pandas', 'numpy', 'openpyxl', 'matplotlib', 'scipy', 'IPython', 'jedi', 'tkinter'],
     noarchive=False,
 )
 pyz = PYZ(a.pure)
@@ -0,0 +1,183 @@
+"""
+End-to-end benchmark of the controller against the local mock e-filing site.
+
+Starts the mock server, runs one job per month through run_worker in a headless
+browser and reports files per minute, per-phase latency and WebDriver command
+counts:
+
+    python benchmarks/benchmark_e2e.py --jobs 3 --rows 25 --latency 0.05 --fault-rate 0.05
+
+Compare the JSON report between commits to catch throughput regressions in main().
+"""
+import argparse
+import collections
+import functools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from mock_efiling_server import THAI_MONTHS, start_server
+
+# Controller functions timed as phases of a job
+PHASES = (
+    "login",
+    "navigate_to_pdf_page",
+    "open_filter_panel",
+    "fill_form",
+    "find_and_download_pdf",
+    "download_pdf",
+    "switch_to_next_page",
+    "logout",
+)
+
+
+class Recorder:
+    """Collects phase durations and downloaded files."""
+
+    def __init__(self):
+        self.phases = collections.defaultdict(list)
+        self.files = 0
+
+    def time_phase(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.phases[name].append(time.perf_counter() - started)
+        return timed
+
+    def count_downloads(self, func):
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            saved_path = func(*args, **kwargs)
+            if saved_path:
+                self.files += 1
+            return saved_path
+        return counted
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def phase_summary(durations):
+    return {
+        'count': len(durations),
+        'total_s': sum(durations),
+        'mean_s': statistics.mean(durations),
+        'p50_s': percentile(durations, 0.5),
+        'p95_s': percentile(durations, 0.95),
+    }
+
+
+def instrument(controller, recorder):
+    """Wrap the controller's phase functions to time them and count downloaded files."""
+    for name in PHASES:
+        setattr(controller, name, recorder.time_phase(name, getattr(controller, name)))
+    controller.download_pdf = recorder.count_downloads(controller.download_pdf)
+
+
+def read_command_metrics(path):
+    """Add up the per-job WebDriver command reports written by the controller."""
+    by_group = collections.Counter()
+    by_phase = collections.Counter()
+    total = 0
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                total += record['commands']
+                for group, entry in record['by_group'].items():
+                    by_group[group] += entry['count']
+                for phase, groups in record['by_phase'].items():
+                    by_phase[phase] += sum(entry['count'] for entry in groups.values())
+    return total, by_group, by_phase
+
+
+def run_benchmark(args):
+    server = start_server(rows=args.rows, page_size=args.page_size, latency=args.latency, fault_rate=args.fault_rate, seed=args.seed)
+    os.environ["EFILLING_BASE_URL"] = server.base_url
+    os.environ["EFILLING_HEADLESS"] = "0" if args.headed else "1"
+    os.environ["EFILLING_TABS"] = str(args.tabs)
+
+    # Imported after the environment is set, the controller reads it at import time
+    import EFillingController as controller
+    from job_queue import InMemoryJobQueue
+    from pdf_validation import PdfValidationQueue
+
+    recorder = Recorder()
+    instrument(controller, recorder)
+
+    download_directory = args.download_directory or tempfile.mkdtemp(prefix="efilling-bench-")
+    account = {'username': 'benchmark', 'password': 'benchmark', 'company_name': 'Benchmark Co', 'row': 1}
+    # Without a month the controller generates one job per month of its default year
+    options = [{'tax_form': args.tax_form, 'tax_year': None, 'tax_month': None, 'tax_id': None, 'tax_company': None, 'tax_ref': None, 'tax_status': None}]
+
+    queue = InMemoryJobQueue()
+    for job in list(controller.generate_jobs([account], options, THAI_MONTHS))[:args.jobs]:
+        queue.put(job)
+
+    validator = PdfValidationQueue(report_path=os.path.join(download_directory, "validation_report.jsonl")) if args.validate else None
+    started = time.perf_counter()
+    try:
+        controller.run_worker(queue, [account], controller.LOGIN_URL, download_directory, validator=validator)
+    finally:
+        if validator is not None:
+            validator.close()
+        server.shutdown()
+    elapsed = time.perf_counter() - started
+
+    total_commands, by_group, by_phase = read_command_metrics(os.path.join(download_directory, controller.METRICS_REPORT_FILENAME))
+    return {
+        'jobs': queue.counts(),
+        'tabs': args.tabs,
+        'files': recorder.files,
+        'elapsed_s': elapsed,
+        'files_per_minute': recorder.files / elapsed * 60 if elapsed else 0.0,
+        'phases': {name: phase_summary(durations) for name, durations in recorder.phases.items()},
+        'webdriver_commands': {
+            'total': total_commands,
+            'per_file': total_commands / recorder.files if recorder.files else None,
+            'by_group': dict(by_group.most_common()),
+            'by_phase': dict(by_phase.most_common()),
+        },
+        'mock_server': dict(server.stats),
+        'invalid_files': sum(1 for record in validator.results if not record['valid']) if validator is not None else None,
+        'download_directory': download_directory,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the controller end to end against the mock e-filing site.")
+    parser.add_argument("--jobs", type=int, default=2, help="number of account x month jobs to run")
+    parser.add_argument("--rows", type=int, default=25)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fault-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tax-form", default="ภ.พ.30")
+    parser.add_argument("--tabs", type=int, default=1, help="periods downloaded side by side in one browser")
+    parser.add_argument("--validate", action="store_true", help="run the PDF validation stage as well")
+    parser.add_argument("--headed", action="store_true", help="show the browser window")
+    parser.add_argument("--download-directory")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(run_benchmark(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure how many download targets the naming module generates per second.
+
+Builds a batch of download URLs in the format the e-filing site uses and times
+naming.target_paths() against naming one record at a time:
+
+    python benchmarks/benchmark_naming.py --records 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import naming
+
+THAI_MONTHS = tuple(naming.THAI_TO_ENG_MONTH)
+SYSTEM_FORMS = ("P30", "P03", "P53", "P01", "P36")
+KINDS = ("TAX_FORM", "RECEIPT", "C02")
+
+
+def make_records(count, companies, seed):
+    rng = random.Random(seed)
+    records = []
+    for index in range(count):
+        kind = rng.choice(KINDS)
+        form = rng.choice(SYSTEM_FORMS)
+        ref = f"2567-{index:06d}"
+        url = f"https://efiling.rd.go.th/rd-cit-edge-printform-service/common/download/{kind.lower()}/{form}{index}/{ref}.pdf/{kind}_{form}{index}_{ref}.pdf"
+        filter_form = [
+            {'form': 'taxForm', 'item': 'ภ.พ.30', 'type': 'dropdown'},
+            {'form': 'taxYear', 'item': rng.choice(("2566", "2567")), 'type': 'dropdown'},
+            {'form': 'taxMonth', 'item': rng.choice(THAI_MONTHS), 'type': 'dropdown'},
+        ]
+        records.append(naming.NameRecord(url, filter_form, index % 4, 4, f"Company {index % companies}"))
+    return records
+
+
+def time_call(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch file naming.")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.companies, args.seed)
+    batch_seconds, _ = time_call(lambda: naming.target_paths(records, "/downloads"))
+    single_seconds, _ = time_call(lambda: [naming.target_paths([record], "/downloads") for record in records])
+
+    print(json.dumps({
+        'records': args.records,
+        'batch_targets_per_s': args.records / batch_seconds,
+        'single_targets_per_s': args.records / single_seconds,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
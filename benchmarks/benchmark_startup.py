@@ -0,0 +1,84 @@
+"""
+Measure how long the controller takes from import to the first completed login.
+
+Each run starts a fresh interpreter so module imports are measured cold:
+
+    python benchmarks/benchmark_startup.py --credentials credentials.xlsx --options options.xlsx
+
+Use --skip-login to time imports and input reading only, or --login-url to point
+the login at another site such as the local mock server.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "webdriver_manager")
+
+# Runs inside the child interpreter and prints one JSON line with the timings
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import EFillingController as controller
+imported = time.perf_counter()
+accounts = controller.read_credentials_from_excel(sys.argv[1])
+options = controller.read_filter_options_from_excel(sys.argv[2])
+inputs_read = time.perf_counter()
+heavy_modules = [name for name in sys.argv[4].split(',') if name in sys.modules]
+logged_in = None
+if sys.argv[3]:
+    driver = controller.login(accounts[0]['username'], accounts[0]['password'], sys.argv[3])
+    logged_in = time.perf_counter()
+    if driver is not None:
+        driver.quit()
+print(json.dumps({
+    'import_s': imported - start,
+    'read_inputs_s': inputs_read - imported,
+    'first_login_s': None if logged_in is None else logged_in - start,
+    'heavy_modules': heavy_modules,
+}))
+"""
+
+
+def run_once(credentials, options, login_url):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, credentials, options, login_url or "", ",".join(HEAVY_MODULES)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - started
+    return result
+
+
+def summarize(results, key):
+    values = [result[key] for result in results if result[key] is not None]
+    if not values:
+        return None
+    return {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark controller startup from import to first login.")
+    parser.add_argument("--credentials", default="credentials.xlsx")
+    parser.add_argument("--options", default="options.xlsx")
+    parser.add_argument("--login-url", default="https://efiling.rd.go.th/rd-efiling-web/login")
+    parser.add_argument("--skip-login", action="store_true", help="only time imports and input reading")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    login_url = None if args.skip_login else args.login_url
+    results = [run_once(os.path.abspath(args.credentials), os.path.abspath(args.options), login_url) for _ in range(args.repeat)]
+
+    report = {key: summarize(results, key) for key in ('process_s', 'import_s', 'read_inputs_s', 'first_login_s')}
+    # Modules that were already imported before the first login started
+    report['heavy_modules_loaded'] = sorted({name for result in results for name in result['heavy_modules']})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Local stand-in for the RD e-filing site, reproducing the DOM the controller relies on.
+
+It serves the login form (#username / #passwordField), the form-status page with
+ng-select[formcontrolname] dropdowns, result rows with button-basic menus, the
+download modal, paging through the next page item and PDF URLs containing
+RECEIPT_ / TAX_FORM_ / C02_. Latency, row counts and faults are configurable:
+
+    python benchmarks/mock_efiling_server.py --port 8765 --rows 25 --latency 0.2 --fault-rate 0.1
+
+Then run the controller with EFILLING_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import html
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAULT_KINDS = ("html", "truncated", "server_error", "slow")
+
+TAX_FORMS = ["ภ.ง.ด.1", "ภ.ง.ด.3", "ภ.ง.ด.53", "ภ.พ.30", "ภ.พ.36"]
+SYSTEM_TAX_FORMS = {"ภ.ง.ด.1": "P01", "ภ.ง.ด.3": "P03", "ภ.ง.ด.53": "P53", "ภ.พ.30": "P30", "ภ.พ.36": "P36"}
+TAX_YEARS = ["2565", "2566", "2567", "2568", "2569"]
+THAI_MONTHS = ["ม.ค.", "ก.พ.", "มี.ค.", "เม.ย.", "พ.ค.", "มิ.ย.", "ก.ค.", "ส.ค.", "ก.ย.", "ต.ค.", "พ.ย.", "ธ.ค."]
+TAX_STATUSES = ["ยื่นแบบสำเร็จ", "รอชำระเงิน"]
+
+LOGIN_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>เข้าสู่ระบบ</title></head>
+<body>
+<form method="post" action="/rd-efiling-web/login">
+  <input id="username" name="username" type="text">
+  <input id="passwordField" name="password" type="password">
+  <button id="login-button" type="submit">เข้าสู่ระบบ</button>
+</form>
+</body></html>
+"""
+
+HOME_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>ยื่นแบบ</title></head>
+<body><a href="/rd-efiling-web/form-status">ตรวจสอบสถานะ</a></body></html>
+"""
+
+FORM_STATUS_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>ยื่นแบบ</title>
+<style>
+  ng-select { display: block; min-height: 24px; border: 1px solid #999; margin: 4px; padding: 2px; }
+  .ng-dropdown-panel { border: 1px solid #666; background: #fff; }
+  .ng-option-label { display: block; padding: 2px; }
+  #filter-panel { display: none; }
+  .dropdown-menu { display: block; border: 1px solid #666; }
+  .modal { position: fixed; top: 10%; left: 10%; background: #fff; border: 1px solid #000; padding: 12px; }
+  #pager li { display: inline-block; padding: 4px 8px; border: 1px solid #999; }
+</style></head>
+<body>
+<div class="collapsed" aria-expanded="true" id="filter-toggle">ค้นหาแบบ</div>
+<form id="filter-panel">
+  __FILTERS__
+  <button type="submit">ค้นหา</button>
+</form>
+<table><tbody id="rows"></tbody></table>
+<ul id="pager"><li title="หน้าถัดไป" class="page-item disabled" id="next-page">หน้าถัดไป</li></ul>
+<script>
+var CONFIG = __CONFIG__;
+var state = {page: 0, values: {}};
+
+function later(callback) { setTimeout(callback, CONFIG.latency * 1000); }
+function removeAll(selector) { document.querySelectorAll(selector).forEach(function (el) { el.remove(); }); }
+
+document.getElementById('filter-toggle').addEventListener('click', function () {
+  document.getElementById('filter-panel').style.display = 'block';
+});
+
+document.querySelectorAll('ng-select').forEach(function (select) {
+  select.addEventListener('click', function () {
+    removeAll('.ng-dropdown-panel');
+    // Options only exist while the dropdown is open, like the real ng-select
+    var panel = document.createElement('div');
+    panel.className = 'ng-dropdown-panel';
+    CONFIG.options[select.getAttribute('formcontrolname')].forEach(function (option) {
+      var label = document.createElement('span');
+      label.className = 'ng-option-label ng-star-inserted';
+      label.textContent = option;
+      label.addEventListener('click', function () {
+        state.values[select.getAttribute('formcontrolname')] = option;
+        select.textContent = option;
+        panel.remove();
+      });
+      panel.appendChild(label);
+    });
+    document.body.appendChild(panel);
+  });
+});
+
+document.getElementById('filter-panel').addEventListener('submit', function (event) {
+  event.preventDefault();
+  later(function () { renderPage(1); });
+});
+
+document.getElementById('next-page').addEventListener('click', function () {
+  if (this.classList.contains('disabled')) { return; }
+  later(function () { renderPage(state.page + 1); });
+});
+
+function pageCount() { return Math.max(1, Math.ceil(CONFIG.rows / CONFIG.page_size)); }
+
+function renderPage(page) {
+  state.page = page;
+  var body = document.getElementById('rows');
+  // Replace every row so handles from the previous page go stale, as on the real site
+  body.innerHTML = '';
+  var first = (page - 1) * CONFIG.page_size;
+  for (var index = first; index < Math.min(CONFIG.rows, first + CONFIG.page_size); index++) {
+    var row = document.createElement('tr');
+    var cell = document.createElement('td');
+    cell.textContent = 'Row ' + (index + 1);
+    var button = document.createElement('button');
+    button.id = 'button-basic';
+    button.setAttribute('aria-controls', 'dropdown-basic');
+    button.textContent = '...';
+    button.addEventListener('click', openMenu.bind(null, index, cell));
+    cell.appendChild(button);
+    row.appendChild(cell);
+    body.appendChild(row);
+  }
+  var next = document.getElementById('next-page');
+  next.className = page >= pageCount() ? 'page-item disabled' : 'page-item';
+}
+
+function openMenu(index, cell) {
+  removeAll('.dropdown-menu');
+  var menu = document.createElement('div');
+  menu.className = 'dropdown-menu';
+  var item = document.createElement('a');
+  item.className = 'dropdown-item';
+  item.textContent = 'พิมพ์ภาพแบบ/ภาพใบเสร็จ';
+  item.addEventListener('click', function () {
+    menu.remove();
+    later(function () { openModal(index); });
+  });
+  menu.appendChild(item);
+  cell.appendChild(menu);
+}
+
+function documentUrl(kind, index) {
+  var form = CONFIG.system_forms[state.values.taxForm] || 'P30';
+  var nid = String(1000000 + index);
+  var ref = '2567-' + String(index).padStart(6, '0');
+  return '/rd-cit-edge-printform-service/common/download/' + kind.toLowerCase() + '/' + form + nid + '/' + ref + '.pdf/' +
+    kind + '_' + form + nid + '_' + ref + '.pdf';
+}
+
+function openModal(index) {
+  removeAll('.modal');
+  var modal = document.createElement('div');
+  modal.className = 'modal';
+  var kinds = ['TAX_FORM', 'RECEIPT'];
+  if (CONFIG.penalty_every && index % CONFIG.penalty_every === 0) { kinds.push('C02'); }
+  kinds.forEach(function (kind) {
+    var label = document.createElement('span');
+    label.textContent = kind;
+    var button = document.createElement('button');
+    button.className = 'btn btn-primary';
+    button.textContent = 'ดาวน์โหลด';
+    button.addEventListener('click', function () { window.open(documentUrl(kind, index), '_blank'); });
+    modal.appendChild(label);
+    modal.appendChild(button);
+  });
+  var close = document.createElement('button');
+  close.className = 'btn button-box button-box-close-modal';
+  close.textContent = 'ปิด';
+  close.addEventListener('click', function () { modal.remove(); });
+  modal.appendChild(close);
+  document.body.appendChild(modal);
+}
+</script>
+</body></html>
+"""
+
+
+def build_pdf(label, size=4096):
+    """Build a small single-page PDF padded to roughly the requested size."""
+    content = f"BT /F1 12 Tf 72 720 Td ({label}) Tj ET".encode("latin-1", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    # Padding comment keeps the file above the validator's minimum size
+    pdf += b"%" + b"0" * max(0, size - len(pdf) - 200) + b"\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return pdf
+
+
+def render_filters():
+    dropdowns = "".join(f'<ng-select formcontrolname="{name}">{html.escape(name)}</ng-select>' for name in ("taxForm", "taxYear", "taxMonth", "taxformStatus"))
+    inputs = "".join(f'<input formcontrolname="{name}" type="text">' for name in ("nid", "fullName", "refNo"))
+    return dropdowns + inputs
+
+
+class MockEFilingServer(ThreadingHTTPServer):
+    """HTTP server holding the mock configuration and request counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address, rows=25, page_size=10, latency=0.0, fault_rate=0.0, faults=FAULT_KINDS, penalty_every=5, seed=None):
+        super().__init__(address, MockEFilingHandler)
+        self.rows = rows
+        self.page_size = page_size
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.faults = tuple(faults)
+        self.penalty_every = penalty_every
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'pdfs': 0, 'faults': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def pick_fault(self):
+        with self.lock:
+            if self.fault_rate and self.random.random() < self.fault_rate:
+                self.stats['faults'] += 1
+                return self.random.choice(self.faults)
+        return None
+
+    def page_config(self):
+        return json.dumps({
+            'rows': self.rows,
+            'page_size': self.page_size,
+            'latency': self.latency,
+            'penalty_every': self.penalty_every,
+            'system_forms': SYSTEM_TAX_FORMS,
+            'options': {'taxForm': TAX_FORMS, 'taxYear': TAX_YEARS, 'taxMonth': THAI_MONTHS, 'taxformStatus': TAX_STATUSES},
+        }, ensure_ascii=False)
+
+
+class MockEFilingHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type="text/html; charset=utf-8", status=200):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.count('requests')
+        time.sleep(self.server.latency)
+        path = urllib.parse.urlparse(self.path).path
+
+        if path == "/rd-efiling-web/login":
+            self.send_body(LOGIN_PAGE)
+        elif path == "/rd-efiling-web/home":
+            self.send_body(HOME_PAGE)
+        elif path == "/rd-efiling-web/form-status":
+            page = FORM_STATUS_PAGE.replace("__FILTERS__", render_filters()).replace("__CONFIG__", self.server.page_config())
+            self.send_body(page)
+        elif path.startswith("/rd-cit-edge-printform-service/") and path.endswith(".pdf"):
+            self.send_pdf(path)
+        else:
+            self.send_body("<html><body>Not found</body></html>", status=404)
+
+    def do_POST(self):
+        self.server.count('requests')
+        time.sleep(self.server.latency)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urllib.parse.urlparse(self.path).path == "/rd-efiling-web/login":
+            self.send_response(303)
+            self.send_header("Location", "/rd-efiling-web/home")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_body("<html><body>Not found</body></html>", status=404)
+
+    def send_pdf(self, path):
+        self.server.count('pdfs')
+        pdf = build_pdf(path.rsplit("/", 1)[-1])
+        fault = self.server.pick_fault()
+        if fault == "html":
+            self.send_body("<html><body>ระบบขัดข้อง กรุณาลองใหม่</body></html>")
+        elif fault == "truncated":
+            self.send_body(pdf[:len(pdf) // 3], content_type="application/pdf")
+        elif fault == "server_error":
+            self.send_body("<html><body>Internal Server Error</body></html>", status=500)
+        else:
+            if fault == "slow":
+                time.sleep(max(1.0, self.server.latency * 10))
+            self.send_body(pdf, content_type="application/pdf")
+
+
+def start_server(host="127.0.0.1", port=0, **config):
+    """
+    Start the mock site on a background thread.
+
+    Returns:
+        MockEFilingServer: Running server, stop it with shutdown().
+    """
+    server = MockEFilingServer((host, port), **config)
+    threading.Thread(target=server.serve_forever, name="mock-efiling", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local mock of the RD e-filing site.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=25, help="result rows per search")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response and page update")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="probability that a PDF download fails")
+    parser.add_argument("--faults", default=",".join(FAULT_KINDS), help="fault kinds to inject")
+    parser.add_argument("--penalty-every", type=int, default=5, help="every n-th row also has a C02 penalty form")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockEFilingServer(
+        (args.host, args.port), rows=args.rows, page_size=args.page_size, latency=args.latency,
+        fault_rate=args.fault_rate, faults=args.faults.split(","), penalty_every=args.penalty_every, seed=args.seed,
+    )
+    print(f"Mock e-filing site running at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
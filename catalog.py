@@ -0,0 +1,241 @@
+"""
+Catalog of downloaded filings, kept in a SQLite file next to the downloads.
+
+The controller adds one entry for every file it stores, so questions about what
+was downloaded are answered from the catalog instead of by walking the folders:
+
+    python catalog.py find --company "ACME CO" --form PND53 --period 2024-03 --kind RECEIPT
+    python catalog.py gaps --year 2024 --form PP30 --kind TAX_FORM
+    python catalog.py duplicates
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from naming import MONTH_INDEX
+
+# Constants
+CATALOG_FILENAME = "filings_catalog.sqlite"
+SQLITE_TIMEOUT = 60
+HASH_CHUNK_SIZE = 1024 * 1024
+COLUMNS = (
+    "location", "company_name", "username", "tax_form", "form_code", "kind", "penalty",
+    "tax_year", "tax_month", "period", "size", "sha256", "url", "added_at",
+)
+
+
+def file_digest(path):
+    """
+    Size and SHA-256 of a file.
+
+    Returns:
+        tuple: (size in bytes, hex digest)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def period_of(tax_year, tax_month):
+    """Period as YYYY-MM from an English year and month abbreviation, or None if either is unknown."""
+    month = str(tax_month or "").upper()
+    if not str(tax_year or "").isdigit() or month not in MONTH_INDEX:
+        return None
+    return f"{tax_year}-{MONTH_INDEX[month]:02d}"
+
+
+class FilingsCatalog:
+    """
+    Index of stored files by company, form, document kind and period.
+
+    Each operation opens its own connection, so the catalog can be shared by the
+    threads storing files and by workers on other hosts writing to the same folder.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS filings ("
+                " location TEXT PRIMARY KEY,"
+                " company_name TEXT,"
+                " username TEXT,"
+                " tax_form TEXT,"
+                " form_code TEXT,"
+                " kind TEXT,"
+                " penalty INTEGER NOT NULL DEFAULT 0,"
+                " tax_year TEXT,"
+                " tax_month TEXT,"
+                " period TEXT,"
+                " size INTEGER,"
+                " sha256 TEXT,"
+                " url TEXT,"
+                " added_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_company_period ON filings (company_name, period)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_form_period ON filings (form_code, period, kind)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_sha256 ON filings (sha256)")
+            conn.execute("CREATE INDEX IF NOT EXISTS filings_url ON filings (url)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, location, metadata):
+        """
+        Add or replace the entry of a stored file.
+
+        Args:
+            location (str): Path or archive location returned by the output backend.
+            metadata (dict): File metadata, including 'size' and 'sha256'.
+
+        Returns:
+            None
+        """
+        entry = {column: metadata.get(column) for column in COLUMNS}
+        entry.update(
+            location=location,
+            penalty=int(bool(metadata.get('penalty'))),
+            period=period_of(metadata.get('tax_year'), metadata.get('tax_month')),
+            added_at=time.time(),
+        )
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO filings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                [entry[column] for column in COLUMNS],
+            )
+
+    def has_url(self, url):
+        """Check whether a file downloaded from the URL is already stored."""
+        if not url:
+            return False
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM filings WHERE url = ? LIMIT 1", (url,)).fetchone() is not None
+
+    def find(self, company=None, username=None, form_code=None, kind=None, period=None, year=None, penalty=None):
+        """Entries matching every given filter, ordered by company and period."""
+        conditions = []
+        params = []
+        for column, value in (('company_name', company), ('username', username), ('form_code', form_code), ('kind', kind), ('period', period)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if year is not None:
+            conditions.append("period LIKE ?")
+            params.append(f"{year}-%")
+        if penalty is not None:
+            conditions.append("penalty = ?")
+            params.append(int(penalty))
+
+        query = "SELECT * FROM filings"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(query + " ORDER BY company_name, period, location", params)]
+
+    def gaps(self, year, form_code=None, kind=None, company=None):
+        """
+        Months of a year with no matching filing, for every company in the catalog.
+
+        Penalty documents do not count as the filing itself.
+
+        Returns:
+            list: (company_name, period) pairs that are missing.
+        """
+        with self._connect() as conn:
+            if company is not None:
+                companies = [company]
+            else:
+                companies = [row[0] for row in conn.execute("SELECT DISTINCT company_name FROM filings ORDER BY company_name")]
+
+            conditions = ["period LIKE ?", "penalty = 0"]
+            params = [f"{year}-%"]
+            for column, value in (('form_code', form_code), ('kind', kind), ('company_name', company)):
+                if value is not None:
+                    conditions.append(f"{column} = ?")
+                    params.append(value)
+            present = {tuple(row) for row in conn.execute(f"SELECT DISTINCT company_name, period FROM filings WHERE {' AND '.join(conditions)}", params)}
+
+        periods = [f"{year}-{month:02d}" for month in range(1, 13)]
+        return [(name, period) for name in companies for period in periods if (name, period) not in present]
+
+    def duplicates(self):
+        """Groups of entries with the same content, as lists of locations."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT sha256, location FROM filings WHERE sha256 IN"
+                " (SELECT sha256 FROM filings WHERE sha256 IS NOT NULL GROUP BY sha256 HAVING COUNT(*) > 1)"
+                " ORDER BY sha256, location"
+            )
+            groups = {}
+            for digest, location in rows:
+                groups.setdefault(digest, []).append(location)
+        return list(groups.values())
+
+
+def print_rows(rows, as_json):
+    if as_json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up downloaded filings in the catalog.")
+    parser.add_argument("--catalog", default=os.path.join(os.path.expanduser("~"), "Downloads", "EFillingController", CATALOG_FILENAME))
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tab separated lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    find = commands.add_parser("find", help="list stored files")
+    find.add_argument("--company")
+    find.add_argument("--username")
+    find.add_argument("--form", help="form code such as PND53 or PP30")
+    find.add_argument("--kind", choices=("RECEIPT", "TAX_FORM", "C02", "UNKNOWN"))
+    find.add_argument("--period", help="YYYY-MM")
+    find.add_argument("--year", help="YYYY")
+
+    gaps = commands.add_parser("gaps", help="list months of a year with no filing")
+    gaps.add_argument("--year", required=True)
+    gaps.add_argument("--company")
+    gaps.add_argument("--form")
+    gaps.add_argument("--kind", choices=("RECEIPT", "TAX_FORM", "C02", "UNKNOWN"))
+
+    commands.add_parser("duplicates", help="list files stored more than once")
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.catalog):
+        parser.error(f"catalog not found: {args.catalog}")
+    catalog = FilingsCatalog(args.catalog)
+
+    if args.command == "find":
+        entries = catalog.find(company=args.company, username=args.username, form_code=args.form, kind=args.kind, period=args.period, year=args.year)
+        if args.json:
+            print_rows(entries, True)
+        else:
+            print_rows([(e['company_name'], e['period'], e['form_code'], e['kind'], e['size'], e['location']) for e in entries], False)
+    elif args.command == "gaps":
+        print_rows(catalog.gaps(args.year, form_code=args.form, kind=args.kind, company=args.company), args.json)
+    else:
+        print_rows(catalog.duplicates(), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
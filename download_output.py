@@ -0,0 +1,339 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+# Constants
+ARCHIVE_KINDS = ("zip", "tar")
+MANIFEST_FILENAME = "archive_manifest.jsonl"
+LOCATION_SEPARATOR = "::"
+REJECTED_DIRECTORY = "rejected"
+LOCK_TIMEOUT = 120
+LOCK_POLL_INTERVAL = 0.2
+
+
+def reserve_file(path):
+    """
+    Atomically claim a file name by creating an empty placeholder.
+
+    O_EXCL creation also works on shared network volumes, so two hosts can never
+    claim the same name.
+
+    Returns:
+        bool: True if the name was free and is now reserved.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def release_file(path):
+    """Remove a reserved placeholder that never received any content."""
+    try:
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT):
+    """
+    Hold a lock file next to a shared file while writing it from several hosts.
+
+    A lock older than the timeout is treated as left behind by a dead process and removed.
+    """
+    lock_path = f"{path}.lock"
+    while not reserve_file(lock_path):
+        try:
+            if time.time() - os.path.getmtime(lock_path) > timeout:
+                logging.warning(f"Removing stale lock {lock_path}")
+                os.remove(lock_path)
+                continue
+        except OSError:
+            continue
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+
+
+def move_to_rejected(rejected_directory, filename, staged_path):
+    """
+    Move a file that failed validation into a rejected folder under a free name.
+
+    Returns:
+        str: Path of the rejected file.
+    """
+    candidate = filename
+    base, extension = os.path.splitext(filename)
+    index = 1
+    while not reserve_file(os.path.join(rejected_directory, candidate)):
+        candidate = f"{base} {index}{extension}"
+        index += 1
+    path = os.path.join(rejected_directory, candidate)
+    shutil.move(staged_path, path)
+    logging.warning(f"Moved {filename} to {path}")
+    return path
+
+
+class FolderOutput:
+    """
+    Save every PDF as a loose file in the company/year/month folders (default layout).
+
+    Files that fail validation are moved to the 'rejected' folder of the download
+    directory, mirroring the company/year/month folders, so the company folders only
+    hold valid PDFs. Without a root they are renamed to '.invalid' in place.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def exists(self, directory, filename):
+        """Check whether a file name is already used in the target directory."""
+        return os.path.exists(os.path.join(directory, filename))
+
+    def reserve(self, directory, filename):
+        """Claim a file name in the target directory. Returns False if it is taken."""
+        return reserve_file(os.path.join(directory, filename))
+
+    def release(self, directory, filename):
+        """Give back a reserved name whose download failed."""
+        release_file(os.path.join(directory, filename))
+
+    def staging_directory(self, directory):
+        """Directory the browser side downloads into; loose files go straight to their final place."""
+        return directory
+
+    def commit(self, directory, filename, staged_path, metadata=None):
+        """
+        Store a downloaded file.
+
+        Args:
+            directory (str): Final directory constructed for the company and period.
+            filename (str): File name of the PDF.
+            staged_path (str): Path the PDF was downloaded to.
+            metadata (dict): Information about the file.
+
+        Returns:
+            str: Location of the stored file.
+        """
+        return staged_path
+
+    def rejected_directory(self, directory):
+        """Folder for files of a period that failed validation."""
+        return os.path.join(self.root, REJECTED_DIRECTORY, os.path.relpath(directory, self.root))
+
+    def reject(self, directory, filename, staged_path, metadata=None):
+        """
+        Move a file that failed validation out of the company folder.
+
+        Returns:
+            str: Path of the rejected file.
+        """
+        if self.root is not None:
+            return move_to_rejected(self.rejected_directory(directory), filename, staged_path)
+        return move_to_rejected(os.path.dirname(staged_path), f"{filename}.invalid", staged_path)
+
+    def close(self):
+        pass
+
+
+class ArchiveOutput:
+    """
+    Write each company's PDFs into one ZIP or tar archive per period.
+
+    The archive for a period sits where the period folder would be, for example
+    'Company/YEAR 2024/3.MAR-2024.zip'. Files are downloaded into a local staging
+    folder, appended to the archive as they arrive and recorded in a manifest
+    index at the root of the download directory, so a PDF can be located without
+    opening every archive. Files that fail validation are moved to the 'rejected'
+    folder of the download directory instead of being archived.
+    """
+
+    def __init__(self, root, kind="zip", staging_root=None):
+        if kind not in ARCHIVE_KINDS:
+            raise ValueError(f"Unsupported archive kind: {kind}")
+        self.root = root
+        self.kind = kind
+        # A staging folder created here is removed again on close
+        self._owns_staging = staging_root is None
+        self.staging_root = staging_root or tempfile.mkdtemp(prefix="efilling-staging-")
+        self.manifest_path = os.path.join(root, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._members = self._load_manifest()
+
+    def _load_manifest(self):
+        members = {}
+        if not os.path.exists(self.manifest_path):
+            return members
+        with open(self.manifest_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                members.setdefault(entry['archive'], set()).add(entry['member'])
+        return members
+
+    def archive_path(self, directory):
+        """Archive file that replaces the given period directory."""
+        return f"{os.path.normpath(directory)}.{self.kind}"
+
+    def exists(self, directory, filename):
+        """Check whether a file name is already used in the period archive or waiting in staging."""
+        archive = os.path.relpath(self.archive_path(directory), self.root)
+        with self._lock:
+            if filename in self._members.get(archive, ()):
+                return True
+        return os.path.exists(os.path.join(self.staging_directory(directory), filename))
+
+    def reserve(self, directory, filename):
+        """
+        Claim a file name for the period archive. Returns False if it is taken.
+
+        Names are only claimed on this host; commit renames a member if another
+        host added the same name to the archive in the meantime.
+        """
+        if self.exists(directory, filename):
+            return False
+        return reserve_file(os.path.join(self.staging_directory(directory), filename))
+
+    def release(self, directory, filename):
+        """Give back a reserved name whose download failed."""
+        release_file(os.path.join(self.staging_directory(directory), filename))
+
+    def staging_directory(self, directory):
+        """Local folder mirroring the period directory, used until the file is archived."""
+        return os.path.join(self.staging_root, os.path.relpath(directory, self.root))
+
+    def commit(self, directory, filename, staged_path, metadata=None):
+        """
+        Append a downloaded file to its period archive and record it in the manifest.
+
+        Args:
+            directory (str): Final directory constructed for the company and period.
+            filename (str): File name of the PDF inside the archive.
+            staged_path (str): Path the PDF was downloaded to.
+            metadata (dict): Information about the file, stored in the manifest.
+
+        Returns:
+            str: Location of the stored file in the form 'archive::member'.
+        """
+        archive_path = self.archive_path(directory)
+        archive = os.path.relpath(archive_path, self.root)
+        logging.info(f"Adding {filename} to archive {archive_path}")
+
+        with self._lock, file_lock(archive_path):
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            if self.kind == "zip":
+                with zipfile.ZipFile(archive_path, 'a', compression=zipfile.ZIP_STORED) as zf:
+                    filename = unique_member_name(zf.namelist(), filename)
+                    zf.write(staged_path, arcname=filename)
+            else:
+                with tarfile.open(archive_path, 'a') as tf:
+                    filename = unique_member_name(tf.getnames(), filename)
+                    tf.add(staged_path, arcname=filename)
+
+            entry = dict(metadata or {})
+            entry.update({
+                'archive': archive,
+                'member': filename,
+                'size': os.path.getsize(staged_path),
+                'added_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            })
+            with file_lock(self.manifest_path), open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._members.setdefault(archive, set()).add(filename)
+
+        os.remove(staged_path)
+        return f"{archive_path}{LOCATION_SEPARATOR}{filename}"
+
+    def rejected_directory(self, directory):
+        """Visible folder for files of a period that were not archived."""
+        return os.path.join(self.root, REJECTED_DIRECTORY, os.path.relpath(directory, self.root))
+
+    def reject(self, directory, filename, staged_path, metadata=None):
+        """
+        Move a file that failed validation out of staging into the rejected folder.
+
+        Returns:
+            str: Path of the rejected file.
+        """
+        return move_to_rejected(self.rejected_directory(directory), filename, staged_path)
+
+    def close(self):
+        """Remove the staging folder, moving files that were never archived to the rejected folder first."""
+        if not self._owns_staging or not os.path.isdir(self.staging_root):
+            return
+        for current, _, filenames in os.walk(self.staging_root):
+            for filename in filenames:
+                staged_path = os.path.join(current, filename)
+                # Empty files are placeholders of reserved names
+                if os.path.getsize(staged_path) > 0:
+                    directory = os.path.join(self.root, os.path.relpath(current, self.staging_root))
+                    self.reject(directory, filename, staged_path)
+        shutil.rmtree(self.staging_root, ignore_errors=True)
+
+
+def unique_member_name(existing_names, filename):
+    """Append ' 1', ' 2', ... before the extension until the name is not in the archive."""
+    existing_names = set(existing_names)
+    base, extension = os.path.splitext(filename)
+    candidate = filename
+    index = 1
+    while candidate in existing_names:
+        candidate = f"{base} {index}{extension}"
+        index += 1
+    return candidate
+
+
+def create_output(kind, root):
+    """
+    Create the output backend for downloaded PDFs.
+
+    Args:
+        kind (str): 'folder' for loose files, 'zip' or 'tar' for per-period archives.
+        root (str): Download directory.
+
+    Returns:
+        Output backend instance.
+    """
+    if kind in (None, "", "folder"):
+        return FolderOutput(root)
+    return ArchiveOutput(root, kind=kind)
+
+
+def read_stored_file(location):
+    """
+    Read the bytes of a stored PDF from a plain path or an 'archive::member' location.
+
+    Args:
+        location (str): Location returned by an output backend's commit.
+
+    Returns:
+        bytes: Content of the PDF.
+    """
+    if LOCATION_SEPARATOR not in location:
+        with open(location, 'rb') as f:
+            return f.read()
+
+    archive_path, member = location.rsplit(LOCATION_SEPARATOR, 1)
+    # ArchiveOutput appends to the archive under this lock, a reader in between sees a half written file
+    with file_lock(archive_path):
+        if archive_path.endswith(".zip"):
+            with zipfile.ZipFile(archive_path) as zf:
+                return zf.read(member)
+        with tarfile.open(archive_path) as tf:
+            return tf.extractfile(member).read()
@@ -0,0 +1,259 @@
+import collections
+import contextlib
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Constants
+SAMPLE_INTERVAL = 0.01
+REPORT_LINES = 40
+
+# Selenium command names grouped into the operations we care about
+COMMAND_GROUPS = {
+    'findElement': 'find',
+    'findElements': 'find',
+    'findChildElement': 'find',
+    'findChildElements': 'find',
+    'clickElement': 'click',
+    'executeScript': 'execute_script',
+    'executeAsyncScript': 'execute_script',
+    'w3cExecuteScript': 'execute_script',
+    'w3cExecuteScriptAsync': 'execute_script',
+    'switchToWindow': 'window',
+    'getWindowHandles': 'window',
+    'getCurrentWindowHandle': 'window',
+    'w3cGetWindowHandles': 'window',
+    'w3cGetCurrentWindowHandle': 'window',
+    'newWindow': 'window',
+    'close': 'window',
+    'get': 'get',
+    'getCurrentUrl': 'get',
+}
+
+
+class DriverMetrics:
+    """
+    Count and time every WebDriver command of one job, split by phase.
+
+    instrument() wraps the driver's execute method, which every driver and
+    element command goes through. phase() names the part of the job the
+    following commands belong to.
+
+    Jobs sharing one browser, such as one per tab, each get metrics created with
+    the session's metrics, which instrumented the driver. Commands sent during a
+    job's phases are recorded in that job's metrics, the rest in the session's.
+    """
+
+    def __init__(self, label="", session=None):
+        self.label = label
+        self.session = session
+        self.current_phase = "setup"
+        self.commands = collections.defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+        self.phase_seconds = collections.Counter()
+        self._active_job = None
+        self._lock = threading.Lock()
+
+    def driver_started(self, driver):
+        # A shared driver is instrumented once, by the session
+        if self.session is None:
+            self.instrument(driver)
+
+    def instrument(self, driver):
+        """Count and time the commands sent through this driver."""
+        execute = driver.execute
+
+        def timed_execute(command, params=None):
+            started = time.perf_counter()
+            try:
+                return execute(command, params)
+            finally:
+                self.record(command, time.perf_counter() - started)
+
+        driver.execute = timed_execute
+        return driver
+
+    def record(self, command, seconds):
+        job = self._active_job
+        if job is not None:
+            job.record(command, seconds)
+            return
+        with self._lock:
+            entry = self.commands[(self.current_phase, command)]
+            entry['count'] += 1
+            entry['seconds'] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        previous = self.current_phase
+        self.current_phase = name
+        if self.session is not None:
+            previous_job, self.session._active_job = self.session._active_job, self
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - started
+            self.current_phase = previous
+            if self.session is not None:
+                self.session._active_job = previous_job
+
+    def summary(self):
+        """
+        Summarize the recorded commands.
+
+        Returns:
+            dict: Totals, per-phase and per-group command counts and times.
+        """
+        with self._lock:
+            items = list(self.commands.items())
+
+        by_phase = {}
+        by_group = {}
+        by_command = collections.Counter()
+        for (phase, command), entry in items:
+            by_command[command] += entry['count']
+            group = COMMAND_GROUPS.get(command, command)
+            for totals, key in ((by_phase.setdefault(phase, {}), group), (by_group, group)):
+                total = totals.setdefault(key, {'count': 0, 'seconds': 0.0})
+                total['count'] += entry['count']
+                total['seconds'] += entry['seconds']
+
+        return {
+            'label': self.label,
+            'commands': sum(entry['count'] for _, entry in items),
+            'command_seconds': sum(entry['seconds'] for _, entry in items),
+            'by_group': by_group,
+            'by_phase': by_phase,
+            'phase_seconds': dict(self.phase_seconds),
+            'by_command': dict(by_command),
+        }
+
+    def write(self, path, extra=None):
+        """Append the summary as one JSON line to a report file."""
+        record = dict(extra or {})
+        record.update(self.summary())
+        record['recorded_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+@contextlib.contextmanager
+def job_phase(observers, name):
+    """Enter a named phase on every observer of the job."""
+    with contextlib.ExitStack() as stack:
+        for observer in observers or ():
+            stack.enter_context(observer.phase(name))
+        yield
+
+
+def notify_driver_started(observers, driver):
+    """Tell every observer of the job about its newly started browser."""
+    for observer in observers or ():
+        observer.driver_started(driver)
+
+
+def notify_file_downloaded(observers, path):
+    """Tell the observers of the job about a downloaded file. Observers that do not track files leave the method out."""
+    for observer in observers or ():
+        file_downloaded = getattr(observer, "file_downloaded", None)
+        if file_downloaded is not None:
+            file_downloaded(path)
+
+
+class SamplingProfiler:
+    """Sample the stack of one thread at a fixed interval and count where time goes."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.inclusive = collections.Counter()
+        self.leaf = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.leaf[self._describe(frame)] += 1
+            seen = set()
+            while frame is not None:
+                name = self._describe(frame)
+                if name not in seen:
+                    self.inclusive[name] += 1
+                    seen.add(name)
+                frame = frame.f_back
+
+    @staticmethod
+    def _describe(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f} ms", "", "Inclusive (function and callees):"]
+        for name, count in self.inclusive.most_common(REPORT_LINES):
+            lines.append(f"{count / max(1, self.samples):7.1%}  {name}")
+        lines += ["", "Exclusive (function itself):"]
+        for name, count in self.leaf.most_common(REPORT_LINES):
+            lines.append(f"{count / max(1, self.samples):7.1%}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+def profile_call(mode, report_base, func, *args, **kwargs):
+    """
+    Run a function under a profiler and write the report next to report_base.
+
+    Args:
+        mode (str): 'cprofile', 'sample', or empty to run without profiling.
+        report_base (str): Path of the report without extension.
+        func: Function to run.
+
+    Returns:
+        Whatever func returns.
+    """
+    if not mode:
+        return func(*args, **kwargs)
+
+    os.makedirs(os.path.dirname(report_base) or ".", exist_ok=True)
+
+    if mode == "sample":
+        profiler = SamplingProfiler(threading.get_ident())
+        profiler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.stop()
+            with open(f"{report_base}.txt", 'w', encoding='utf-8') as f:
+                f.write(profiler.report())
+            logging.info(f"Sampling profile written to {report_base}.txt")
+
+    # Profiler modules are only loaded when profiling, they slow down every start otherwise
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(f"{report_base}.prof")
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(REPORT_LINES)
+        with open(f"{report_base}.txt", 'w', encoding='utf-8') as f:
+            f.write(text.getvalue())
+        logging.info(f"cProfile report written to {report_base}.prof")
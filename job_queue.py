@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+# Constants
+LEASE_SECONDS = 300
+MAX_JOB_ATTEMPTS = 3
+SQLITE_TIMEOUT = 60
+
+JOB_STATUSES = ("pending", "running", "done", "failed")
+
+
+def job_key(job):
+    """
+    Build the identifier of an account and period job.
+
+    The key only depends on the job content, so every host that generates the
+    same jobs enqueues them under the same identifier and duplicates are ignored.
+    """
+    items = [str(item['item'] or "") for item in job['filter_form']]
+    return "|".join([job['username']] + items)
+
+
+def default_worker_id():
+    """Worker identifier that is unique across hosts sharing the queue."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def new_run_id():
+    """Identifier of a run that is unique across hosts and restarts."""
+    return f"{default_worker_id()}-{int(time.time())}"
+
+
+class LeaseLost(Exception):
+    """Raised when another worker took over a job because its lease expired."""
+
+
+class InMemoryJobQueue:
+    """
+    In-process job queue with the same interface as SQLiteJobQueue.
+
+    Used when a single process does all the work and as a stand-in for tests.
+    """
+
+    def __init__(self, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def put(self, job, run_id=None):
+        """
+        Add a job unless a job with the same key exists. Returns True if it was added.
+
+        A job that is done or failed in an earlier run, with another run_id, is
+        queued again with fresh attempts. Without a run_id existing jobs are
+        never queued again.
+        """
+        key = job_key(job)
+        with self._lock:
+            record = self._jobs.get(key)
+            if record is not None and (run_id is None or record['run_id'] == run_id or record['status'] not in ('done', 'failed')):
+                return False
+            self._jobs[key] = {'job': dict(job, job_id=key), 'status': 'pending', 'worker_id': None, 'lease_expires': None, 'attempts': 0, 'last_error': None, 'run_id': run_id}
+            return True
+
+    def claim(self, worker_id, username=None):
+        """Lease the oldest pending job to a worker, optionally only a job of one account. Returns the job or None."""
+        self.requeue_expired()
+        with self._lock:
+            for record in self._jobs.values():
+                if record['status'] == 'pending' and username in (None, record['job']['username']):
+                    record.update(status='running', worker_id=worker_id, lease_expires=time.time() + self.lease_seconds)
+                    record['attempts'] += 1
+                    return dict(record['job'], attempt=record['attempts'])
+        return None
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease of a running job. Returns False if the worker no longer owns it."""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or record['status'] != 'running' or record['worker_id'] != worker_id:
+                return False
+            record['lease_expires'] = time.time() + self.lease_seconds
+            return True
+
+    def complete(self, job_id, worker_id):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is not None and record['worker_id'] == worker_id:
+                record.update(status='done', lease_expires=None)
+
+    def fail(self, job_id, worker_id, error):
+        """Put a failed job back in the queue, or mark it failed once it ran out of attempts."""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or record['worker_id'] != worker_id:
+                return
+            status = 'pending' if record['attempts'] < self.max_attempts else 'failed'
+            record.update(status=status, worker_id=None, lease_expires=None, last_error=str(error))
+
+    def requeue_expired(self):
+        """Return jobs whose lease expired, because their worker died, to the queue."""
+        now = time.time()
+        requeued = 0
+        with self._lock:
+            for record in self._jobs.values():
+                if record['status'] == 'running' and record['lease_expires'] < now:
+                    status = 'pending' if record['attempts'] < self.max_attempts else 'failed'
+                    record.update(status=status, worker_id=None, lease_expires=None, last_error="lease expired")
+                    requeued += 1
+        return requeued
+
+    def counts(self):
+        """Number of jobs in each status."""
+        with self._lock:
+            counts = dict.fromkeys(JOB_STATUSES, 0)
+            for record in self._jobs.values():
+                counts[record['status']] += 1
+            return counts
+
+
+class SQLiteJobQueue:
+    """
+    Job queue stored in a SQLite file, shared by workers on several hosts.
+
+    Put the file on a volume every host can reach. Each operation opens its own
+    connection and takes the write lock with BEGIN IMMEDIATE, so workers never
+    claim the same job. Leases use wall-clock time, so host clocks must be in sync.
+    """
+
+    def __init__(self, path, lease_seconds=LEASE_SECONDS, max_attempts=MAX_JOB_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending',"
+                " worker_id TEXT,"
+                " lease_expires REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT,"
+                " updated_at REAL,"
+                " run_id TEXT)"
+            )
+            # Queue files written before run ids were recorded
+            if "run_id" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN run_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+
+    def _transaction(self):
+        return _Transaction(self.path)
+
+    def put(self, job, run_id=None):
+        """
+        Add a job unless a job with the same key exists. Returns True if it was added.
+
+        Hosts of the same run pass the same run_id, so the jobs they all enqueue
+        are added once. A job that is done or failed in an earlier run, with
+        another run_id, is queued again with fresh attempts. Without a run_id
+        existing jobs are never queued again, for workers joining a run.
+        """
+        key = job_key(job)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (job_id, payload, updated_at, run_id) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (job_id) DO UPDATE SET status = 'pending', payload = excluded.payload, worker_id = NULL, lease_expires = NULL,"
+                " attempts = 0, last_error = NULL, updated_at = excluded.updated_at, run_id = excluded.run_id"
+                " WHERE excluded.run_id IS NOT NULL AND jobs.status IN ('done', 'failed') AND jobs.run_id IS NOT excluded.run_id",
+                (key, json.dumps(dict(job, job_id=key), ensure_ascii=False), time.time(), run_id),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self, worker_id, username=None):
+        """Lease the oldest pending job to a worker, optionally only a job of one account. Returns the job or None."""
+        self.requeue_expired()
+        now = time.time()
+        with self._transaction() as conn:
+            if username is None:
+                row = conn.execute("SELECT job_id, payload, attempts FROM jobs WHERE status = 'pending' ORDER BY rowid LIMIT 1").fetchone()
+            else:
+                # Job ids start with the username, see job_key
+                prefix = f"{username}|"
+                row = conn.execute(
+                    "SELECT job_id, payload, attempts FROM jobs WHERE status = 'pending' AND substr(job_id, 1, length(?)) = ? ORDER BY rowid LIMIT 1",
+                    (prefix, prefix),
+                ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                (worker_id, now + self.lease_seconds, now, row[0]),
+            )
+            return dict(json.loads(row[1]), attempt=row[2] + 1)
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease of a running job. Returns False if the worker no longer owns it."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, now, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, updated_at = ? WHERE job_id = ? AND worker_id = ?",
+                (time.time(), job_id, worker_id),
+            )
+
+    def fail(self, job_id, worker_id, error):
+        """Put a failed job back in the queue, or mark it failed once it ran out of attempts."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,"
+                " worker_id = NULL, lease_expires = NULL, last_error = ?, updated_at = ? WHERE job_id = ? AND worker_id = ?",
+                (self.max_attempts, str(error), time.time(), job_id, worker_id),
+            )
+
+    def requeue_expired(self):
+        """Return jobs whose lease expired, because their worker died, to the queue."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,"
+                " worker_id = NULL, lease_expires = NULL, last_error = 'lease expired', updated_at = ?"
+                " WHERE status = 'running' AND lease_expires < ?",
+                (self.max_attempts, now, now),
+            )
+            if cursor.rowcount:
+                logging.warning(f"Requeued {cursor.rowcount} jobs with expired leases")
+            return cursor.rowcount
+
+    def counts(self):
+        """Number of jobs in each status."""
+        with self._transaction() as conn:
+            counts = dict.fromkeys(JOB_STATUSES, 0)
+            for status, count in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+                counts[status] = count
+            return counts
+
+
+class _Transaction:
+    """Open a connection and hold the database write lock until the block ends."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+class LeaseKeeper:
+    """
+    Send heartbeats for a claimed job from a background thread while the job runs.
+
+    When a heartbeat finds the job taken over by another worker, lost is set and
+    on_lost() is called from the heartbeat thread, so the job can be stopped
+    instead of downloading alongside the new owner.
+    """
+
+    def __init__(self, queue, job_id, worker_id, interval=None, on_lost=None):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval or max(1, queue.lease_seconds / 3)
+        self.on_lost = on_lost
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_id):
+                    logging.warning(f"Lost lease on job {self.job_id}")
+                    self.lost = True
+                    if self.on_lost is not None:
+                        self.on_lost()
+                    return
+            except Exception as e:
+                logging.warning(f"Failed to send heartbeat for job {self.job_id}: {e}")
+
+    def raise_if_lost(self):
+        if self.lost:
+            raise LeaseLost(f"lease on job {self.job_id} was taken over")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
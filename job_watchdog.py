@@ -0,0 +1,374 @@
+import contextlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Constants
+JOB_TIMEOUT = int(os.environ.get("EFILLING_JOB_TIMEOUT", "1800"))
+PHASE_TIMEOUTS = {
+    'login': 120,
+    'navigate': 120,
+    'filter': 180,
+    'download': 900,
+    'next_page': 120,
+    'logout': 60,
+}
+CHECK_INTERVAL = 1.0
+QUIT_TIMEOUT = 10
+# Phases that must still run after the job expired, so the browser gets cleaned up
+CLEANUP_PHASES = ("logout",)
+BROWSER_NAMES = ("chromedriver", "chrome", "chromium")
+AUTOMATION_FLAGS = ("--enable-automation", "--test-type=webdriver", "--remote-debugging-port")
+# Every worker lists the browsers it started here, see register_browser()
+BROWSER_REGISTRY = os.environ.get("EFILLING_BROWSER_REGISTRY", os.path.join(tempfile.gettempdir(), "efilling-browsers"))
+
+_registry_lock = threading.Lock()
+
+
+class JobTimeout(Exception):
+    """Raised when a job ran past its wall-clock deadline and its browser was killed."""
+
+
+def list_processes():
+    """
+    List running processes on POSIX systems.
+
+    Returns:
+        dict: Maps pid to a dictionary with 'ppid', 'name' and 'cmdline'.
+    """
+    processes = {}
+    if os.path.isdir("/proc"):
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as f:
+                    stat = f.read().decode(errors="replace")
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    cmdline = f.read().replace(b"\0", b" ").decode(errors="replace").strip()
+            except OSError:
+                continue
+            # The process name is in parentheses and may contain spaces
+            name = stat[stat.index("(") + 1:stat.rindex(")")]
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+            processes[int(entry)] = {'ppid': ppid, 'name': name, 'cmdline': cmdline}
+        return processes
+
+    output = subprocess.run(["ps", "-A", "-o", "pid=,ppid=,comm="], capture_output=True, text=True).stdout
+    for line in output.splitlines():
+        parts = line.split(None, 2)
+        if len(parts) == 3:
+            processes[int(parts[0])] = {'ppid': int(parts[1]), 'name': os.path.basename(parts[2]), 'cmdline': parts[2]}
+    return processes
+
+
+def descendant_pids(pid, processes=None):
+    """All processes started, directly or indirectly, by the given process."""
+    processes = processes if processes is not None else list_processes()
+    children = {}
+    for child, info in processes.items():
+        children.setdefault(info['ppid'], []).append(child)
+
+    found = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def kill_process_tree(pid):
+    """
+    Kill a process and everything it started, children first.
+
+    Args:
+        pid (int): Process id of the tree's root, usually chromedriver.
+
+    Returns:
+        None
+    """
+    logging.warning(f"Killing process tree of {pid}")
+    if sys.platform == "win32":
+        subprocess.run(["taskkill", "/PID", str(pid), "/T", "/F"], capture_output=True)
+        return
+
+    for target in list(reversed(descendant_pids(pid))) + [pid]:
+        try:
+            os.kill(target, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def driver_pid(driver):
+    """Process id of the chromedriver behind a driver, or None if it is unknown."""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+def browser_process_tree(driver):
+    """Process ids of a driver's chromedriver and the browser processes it started."""
+    pid = driver_pid(driver)
+    if pid is None:
+        return []
+    if sys.platform == "win32":
+        return [pid]
+    return [pid] + descendant_pids(pid)
+
+
+def pid_alive(pid):
+    if sys.platform == "win32":
+        output = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"], capture_output=True, text=True).stdout
+        return str(pid) in output
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # A zombie still answers signals but has already exited
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[1].split()[0] != b"Z"
+    except OSError:
+        return True
+
+
+def reap_processes(pids, timeout=QUIT_TIMEOUT):
+    """
+    Wait for processes to exit after driver.quit(), killing any that are left.
+
+    Returns:
+        list: Process ids that had to be killed.
+    """
+    deadline = time.monotonic() + timeout
+    remaining = list(pids)
+    while remaining and time.monotonic() < deadline:
+        remaining = [pid for pid in remaining if pid_alive(pid)]
+        if remaining:
+            time.sleep(0.2)
+
+    for pid in remaining:
+        logging.warning(f"Browser process {pid} still running after quit, killing it")
+        kill_process_tree(pid)
+    return remaining
+
+
+def is_automation_browser(info):
+    name = info['name'].lower()
+    if "chromedriver" in name:
+        return True
+    return any(browser in name for browser in BROWSER_NAMES) and any(flag in info['cmdline'] for flag in AUTOMATION_FLAGS)
+
+
+def process_start_time(pid):
+    """Start time of a process in clock ticks since boot, or None where /proc is not available."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return int(f.read().rsplit(b")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def registry_path(registry=BROWSER_REGISTRY, pid=None):
+    """File listing the browsers of one worker process, named by host and pid so a shared directory works."""
+    return os.path.join(registry, f"{socket.gethostname()}-{pid or os.getpid()}.pids")
+
+
+def _read_registry(path):
+    entries = []
+    try:
+        with open(path) as f:
+            for line in f:
+                pid, _, started = line.strip().partition(" ")
+                if pid.isdigit():
+                    entries.append((int(pid), int(started) if started.isdigit() else None))
+    except OSError:
+        pass
+    return entries
+
+
+def _write_registry(path, entries):
+    if not entries:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        return
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        f.writelines(f"{pid} {started if started is not None else ''}\n" for pid, started in entries)
+    os.replace(temp_path, path)
+
+
+def register_browser(driver, registry=BROWSER_REGISTRY):
+    """
+    Record a driver's chromedriver and browser processes as owned by this worker.
+
+    reap_orphaned_browsers() only kills browsers whose owning worker is gone, so
+    browsers of running workers are never touched, whoever their parent is.
+
+    Returns:
+        list: The recorded process ids, to pass to forget_browsers() after quit.
+    """
+    pids = browser_process_tree(driver)
+    if not pids:
+        return []
+    os.makedirs(registry, exist_ok=True)
+    with _registry_lock:
+        path = registry_path(registry)
+        entries = _read_registry(path)
+        entries.extend((pid, process_start_time(pid)) for pid in pids)
+        _write_registry(path, entries)
+    return pids
+
+
+def forget_browsers(pids, registry=BROWSER_REGISTRY):
+    """Remove browser processes that were shut down from this worker's registry."""
+    pids = set(pids)
+    with _registry_lock:
+        path = registry_path(registry)
+        _write_registry(path, [entry for entry in _read_registry(path) if entry[0] not in pids])
+
+
+def reap_orphaned_browsers(registry=BROWSER_REGISTRY):
+    """
+    Kill chromedriver and automated Chrome processes left behind by dead workers.
+
+    Every worker records its browsers with register_browser(). A browser is
+    orphaned when the worker that recorded it is no longer running on this host.
+    The parent process is not used, so browsers of live workers are left alone
+    when a worker runs as PID 1 in a container, and orphans adopted by a subreaper
+    such as tini are still found. A recorded process is only killed while it is
+    still an automated browser started at the recorded time, so reused pids are
+    skipped. Only supported on POSIX systems.
+
+    Returns:
+        list: Process ids that were killed.
+    """
+    if sys.platform == "win32":
+        logging.info("Skipping orphaned browser cleanup on Windows")
+        return []
+    if not os.path.isdir(registry):
+        return []
+
+    prefix = f"{socket.gethostname()}-"
+    processes = list_processes()
+    killed = []
+    with _registry_lock:
+        for name in os.listdir(registry):
+            if not (name.startswith(prefix) and name.endswith(".pids")):
+                continue
+            owner = name[len(prefix):-len(".pids")]
+            if not owner.isdigit() or int(owner) == os.getpid() or pid_alive(int(owner)):
+                continue
+
+            path = os.path.join(registry, name)
+            for pid, started in _read_registry(path):
+                info = processes.get(pid)
+                if info is None or not is_automation_browser(info) or process_start_time(pid) != started:
+                    continue
+                logging.warning(f"Reaping browser process {pid} ({info['name']}) of exited worker {owner}")
+                kill_process_tree(pid)
+                killed.append(pid)
+            _write_registry(path, [])
+    return killed
+
+
+class JobWatchdog:
+    """
+    Enforce wall-clock deadlines on a job and its phases.
+
+    Used as a job observer: driver_started() records the chromedriver process
+    and phase() starts the phase deadline. When the job or phase deadline
+    passes, a background thread kills the browser process tree. Every WebDriver
+    call then fails fast, and entering the next phase raises JobTimeout so the
+    job can be retried.
+    """
+
+    def __init__(self, job_timeout=JOB_TIMEOUT, phase_timeouts=None):
+        self.job_timeout = job_timeout
+        self.phase_timeouts = dict(PHASE_TIMEOUTS, **(phase_timeouts or {}))
+        self.expired = None
+        self._driver = None
+        self._job_deadline = None
+        self._phase = None
+        self._phase_deadline = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-watchdog", daemon=True)
+
+    def __enter__(self):
+        self._job_deadline = time.monotonic() + self.job_timeout
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+    def driver_started(self, driver):
+        with self._lock:
+            self._driver = driver
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if name not in CLEANUP_PHASES:
+            self.raise_if_expired()
+        timeout = self.phase_timeouts.get(name)
+        with self._lock:
+            previous = (self._phase, self._phase_deadline)
+            self._phase = name
+            self._phase_deadline = time.monotonic() + timeout if timeout else None
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phase, self._phase_deadline = previous
+
+    def extend(self):
+        """Start a new job deadline, for a browser that runs several jobs one after another."""
+        with self._lock:
+            self._job_deadline = time.monotonic() + self.job_timeout
+
+    def raise_if_expired(self):
+        if self.expired:
+            raise JobTimeout(self.expired)
+
+    def abort(self, reason):
+        """Kill the browser now, for a job that has to stop before its deadline, such as one whose lease was lost."""
+        with self._lock:
+            if self.expired:
+                return
+            self.expired = reason
+            driver = self._driver
+        logging.error(f"Aborting job: {reason}")
+        self._kill(driver)
+
+    def _kill(self, driver):
+        pid = driver_pid(driver)
+        if pid is not None:
+            kill_process_tree(pid)
+
+    def _run(self):
+        while not self._stop.wait(CHECK_INTERVAL):
+            now = time.monotonic()
+            with self._lock:
+                if self.expired:
+                    continue
+                if now > self._job_deadline:
+                    self.expired = f"job exceeded {self.job_timeout}s"
+                elif self._phase_deadline is not None and now > self._phase_deadline:
+                    self.expired = f"phase '{self._phase}' exceeded {self.phase_timeouts[self._phase]}s"
+                else:
+                    continue
+                driver = self._driver
+
+            logging.error(f"Watchdog deadline passed: {self.expired}")
+            self._kill(driver)
@@ -0,0 +1,320 @@
+"""
+File and folder names of downloaded filings.
+
+Lookup tables are built once at import and frozen. A download URL is parsed in
+a single scan, and target_paths() names a whole batch of downloads in one call
+for modes that generate many targets at once. Nothing here logs, so it stays
+cheap on the per-file path.
+"""
+import os
+import re
+from types import MappingProxyType
+from typing import NamedTuple
+
+THAI_TO_ENG_MONTH = MappingProxyType({
+    "ม.ค.": "JAN",
+    "ก.พ.": "FEB",
+    "มี.ค.": "MAR",
+    "เม.ย.": "APR",
+    "พ.ค.": "MAY",
+    "มิ.ย.": "JUN",
+    "ก.ค.": "JUL",
+    "ส.ค.": "AUG",
+    "ก.ย.": "SEP",
+    "ต.ค.": "OCT",
+    "พ.ย.": "NOV",
+    "ธ.ค.": "DEC",
+})
+
+THAI_TO_ENG_TAX_FORM = MappingProxyType({
+    "ภ.ง.ด.1": "PND1",
+    "ภ.ง.ด.2": "PND2",
+    "ภ.ง.ด.3": "PND3",
+    "ภ.ง.ด.53": "PND53",
+    "ภ.ง.ด.90": "PND90",
+    "ภ.ง.ด.91": "PND91",
+    "ภ.ง.ด.93": "PND93",
+    "ภ.ง.ด.94": "PND94",
+    "ภ.ง.ด.96": "PND96",
+    "ภ.ง.ด.97": "PND97",
+    "ภ.ง.ด.98": "PND98",
+    "ภ.ง.ด.99": "PND99",
+    "ภ.ง.ด.1ก": "PND1KOR",
+    "ภ.ง.ด.2ก": "PND2KOR",
+    "ภ.ง.ด.3ก": "PND3KOR",
+    "ภ.ง.ด.53ก": "PND53KOR",
+    "ภ.ง.ด.90ก": "PND90KOR",
+    "ภ.ง.ด.91ก": "PND91KOR",
+    "ภ.ง.ด.91 (นายจ้างยื่นแทน)": "PND91KOR EMPLOYER",
+    "ภ.ง.ด.93ก": "PND93KOR",
+    "ภ.ง.ด.94ก": "PND94KOR",
+    "ภ.ง.ด.96ก": "PND96KOR",
+    "ภ.ง.ด.97ก": "PND97KOR",
+    "ภ.ง.ด.98ก": "PND98KOR",
+    "ภ.ง.ด.99ก": "PND99KOR",
+    "ภ.พ.30": "PP30",
+    "ภ.พ.36": "PP36",
+    "ภ.ธ.40": "PP40",
+    "งบการเงิน": "FinancialStatement",
+    "แบบแจ้งเงินได้ต่างด้าว": "FORIEGNINCOME",
+})
+
+SYSTEM_TO_ENG_TAX_FORM = MappingProxyType({
+    "P01": "PND1",
+    "P02": "PND2",
+    "P03": "PND3",
+    "P50": "PND50",
+    "P51": "PND51",
+    "P52": "PND52",
+    "P53": "PND53",
+    "P54": "PND54",
+    "P55": "PND55",
+    "P90": "PND90",
+    "P91": "PND91",
+    "P93": "PND93",
+    "P94": "PND94",
+    "P96": "PND96",
+    "P97": "PND97",
+    "P98": "PND98",
+    "P99": "PND99",
+    "P1A": "PND1A",
+    "P2A": "PND2A",
+    "P3A": "PND3A",
+    "P53A": "PND53A",
+    "P90A": "PND90A",
+    "P91A": "PND91A",
+    "P91E": "PND91E",
+    "P93A": "PND93A",
+    "P94A": "PND94A",
+    "P96A": "PND96A",
+    "P97A": "PND97A",
+    "P98A": "PND98A",
+    "P99A": "PND99A",
+    "P30": "PP30",
+    "P36": "PP36",
+    "P40": "PT40",
+})
+
+MONTH_INDEX = MappingProxyType({month: index for index, month in enumerate(THAI_TO_ENG_MONTH.values(), start=1)})
+
+# Document kinds in the order get_file_name checks them, the first one present wins
+DOCUMENT_KINDS = ("RECEIPT", "TAX_FORM", "C02")
+# Kinds never overlap, so one scan finds every occurrence. The lookahead reads the
+# system form code after "KIND_" without consuming it. Codes are read as three
+# characters, as the controller always has.
+URL_TOKEN_PATTERN = re.compile(r"(?P<kind>RECEIPT|TAX_FORM|C02)(?=(?:_(?P<code>.{0,3}))?)")
+
+
+def convert_thai_month_to_eng(tax_month):
+    """Convert Thai month abbreviation to English."""
+    if tax_month is None:
+        return "MONTH"
+    return THAI_TO_ENG_MONTH.get(tax_month, tax_month)
+
+
+def convert_thai_tax_form_to_eng(tax_form):
+    """Convert Thai tax form abbreviation to English."""
+    if tax_form is None or tax_form == "":
+        return ""
+    return THAI_TO_ENG_TAX_FORM.get(tax_form, tax_form)
+
+
+def convert_system_tax_form_to_eng(tax_form):
+    """Convert the tax form code used in download URLs to English."""
+    return SYSTEM_TO_ENG_TAX_FORM.get(tax_form, "TAX_FORM")
+
+
+def convert_thai_year_to_eng(tax_year):
+    """
+    Convert Thai year to English year.
+
+    Args:
+        tax_year (str): Thai year in the format "2567".
+
+    Returns:
+        str: English year in the format "2024".
+    """
+    if (tax_year is None) or (tax_year == ""):
+        return "YEAR"
+    return str(int(tax_year) - 543)
+
+
+def get_month_index(month):
+    """Get month index."""
+    return MONTH_INDEX[month]
+
+
+def split_tax_form(tax_form, url_extr):
+    """
+    Split tax form from URL.
+
+    Args:
+        tax_form (str): Prefix of the form code in the URL, such as "RECEIPT_".
+        url_extr (str): Last part of the URL.
+
+    Returns:
+        str: Tax form.
+    """
+    tax_name_index = url_extr.find(tax_form)
+    if tax_name_index < 0:
+        return "UNKNOWN"
+    tax_name_index += len(tax_form)
+    return convert_system_tax_form_to_eng(url_extr[tax_name_index:tax_name_index + 3])
+
+
+class DownloadToken(NamedTuple):
+    """Document kind and English form of a download URL."""
+
+    kind: str
+    form: str
+
+
+def parse_download_url(url):
+    """
+    Read the document kind and form from a download URL in a single scan.
+
+    Returns:
+        DownloadToken: kind is RECEIPT, TAX_FORM, C02 or UNKNOWN. form is None
+        for UNKNOWN and "UNKNOWN" when the kind has no form code after it.
+    """
+    url_extr = url.rsplit('/', 1)[-1]
+    present = {}
+    for match in URL_TOKEN_PATTERN.finditer(url_extr):
+        kind, code = match.group('kind'), match.group('code')
+        if kind not in present or (present[kind] is None and code is not None):
+            present[kind] = code
+    for kind in DOCUMENT_KINDS:
+        if kind in present:
+            code = present[kind]
+            return DownloadToken(kind, "UNKNOWN" if code is None else convert_system_tax_form_to_eng(code))
+    return DownloadToken("UNKNOWN", None)
+
+
+def is_penalty(kind, max_button, button_counter):
+    """Penalty fee documents are C02 forms and the third receipt of a row with more than three downloads."""
+    return kind == "C02" or (kind == "RECEIPT" and max_button > 3 and button_counter == 2)
+
+
+def classify_download(url, max_button, button_counter):
+    """
+    Read the document kind and tax form of a download from its URL.
+
+    Returns:
+        tuple: (kind, form code, whether the document is a penalty fee)
+    """
+    kind, form = parse_download_url(url)
+    return kind, form, is_penalty(kind, max_button, button_counter)
+
+
+class FilterNames(NamedTuple):
+    """English names of the filter form's tax form, year and month."""
+
+    tax_form: str
+    tax_year: str
+    tax_month: str
+
+
+def filter_names(filter_form):
+    return FilterNames(
+        convert_thai_tax_form_to_eng(filter_form[0]['item']),
+        convert_thai_year_to_eng(filter_form[1]['item']),
+        convert_thai_month_to_eng(filter_form[2]['item']).upper(),
+    )
+
+
+def base_file_name(url, names, username, max_button, button_counter):
+    """
+    File name of a download, before making it unique.
+
+    Args:
+        url (str): URL of the opened PDF.
+        names (FilterNames): English names of the filter form.
+        username (str): Name shown at the end of the file name, the company name in practice.
+        max_button (int): Number of download buttons in the modal.
+        button_counter (int): Index of the clicked button.
+
+    Returns:
+        str: File name.
+    """
+    kind, form = parse_download_url(url)
+    period = f"{names.tax_month}-{names.tax_year}"
+    if kind == "RECEIPT":
+        if max_button > 3 and button_counter == 2:
+            return f"RECEIPT_POR.2 - PENALTY FEE {form} {period} {username}.pdf"
+        return f"RECEIPT_{form} {period} {username}.pdf"
+    if kind == "TAX_FORM":
+        return f"{form} {period} {username}.pdf"
+    if kind == "C02":
+        return f"POR.2 - PENALTY FEE {form} {period} {username}.pdf"
+    return f"UNKNOWN_{names.tax_form} {period} {username}.pdf"
+
+
+def numbered_file_name(base_filename, index):
+    """The index-th alternative of a file name that is taken."""
+    return f"{base_filename[:-4]} {index}.pdf"
+
+
+def construct_download_directory(download_directory, company_name, tax_year, tax_month):
+    """Construct download directory."""
+    destination = "/".join([company_name, f"YEAR {tax_year}", f"{get_month_index(tax_month)}.{tax_month}-{tax_year}"])
+    return os.path.join(download_directory, destination)
+
+
+class NameRecord(NamedTuple):
+    """One download to name: its URL, filter form, clicked button and company."""
+
+    url: str
+    filter_form: list
+    button_index: int
+    max_buttons: int
+    company_name: str
+
+
+def target_paths(records, download_directory, taken=None):
+    """
+    Target path of every download in a batch.
+
+    Filter forms repeat across a batch, so each is converted once. Names are
+    made unique within the batch and against existing files, numbering them the
+    way get_file_name does.
+
+    Args:
+        records: Iterable of NameRecord or (url, filter_form, button_index, max_buttons, company_name) tuples.
+        download_directory (str): Root directory of the downloads.
+        taken (callable): taken(directory, filename) returns True for names in use,
+            such as an output backend's exists. Only names in the batch are avoided by default.
+
+    Returns:
+        list: Full target path of each record, in order.
+    """
+    filter_cache = {}
+    directory_cache = {}
+    used = set()
+    # Next number to try for each taken name, so repeated names do not rescan from 1
+    next_index = {}
+    paths = []
+    for url, filter_form, button_index, max_buttons, company_name in records:
+        key = tuple(item['item'] for item in filter_form[:3])
+        names = filter_cache.get(key)
+        if names is None:
+            names = filter_cache[key] = filter_names(filter_form)
+
+        directory_key = (company_name, names.tax_year, names.tax_month)
+        directory = directory_cache.get(directory_key)
+        if directory is None:
+            # construct_download_directory uses the month as the converter returns it
+            month = convert_thai_month_to_eng(filter_form[2]['item'])
+            directory = directory_cache[directory_key] = construct_download_directory(download_directory, company_name, names.tax_year, month)
+
+        base_filename = base_file_name(url, names, company_name, max_buttons, button_index)
+        filename = base_filename
+        index = next_index.get((directory, base_filename), 1)
+        if index > 1:
+            filename = numbered_file_name(base_filename, index - 1)
+        while (directory, filename) in used or (taken is not None and taken(directory, filename)):
+            filename = numbered_file_name(base_filename, index)
+            index += 1
+        next_index[(directory, base_filename)] = index
+        used.add((directory, filename))
+        paths.append(os.path.join(directory, filename))
+    return paths
@@ -0,0 +1,221 @@
+import functools
+import logging
+
+from selenium.common.exceptions import ElementClickInterceptedException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Constants
+MAX_ATTEMPTS = 5
+WAIT_TIMEOUT = 10
+LOGGED_IN_TITLE = 'ยื่นแบบ'
+
+# Precompiled locators
+USERNAME_FIELD = (By.ID, 'username')
+PASSWORD_FIELD = (By.ID, 'passwordField')
+FILTER_PANEL_TOGGLE = (By.XPATH, "//div[@class='collapsed' and @aria-expanded='true']")
+SEARCH_BUTTON = (By.XPATH, "//button[@type='submit']")
+ROW_MENU_BUTTONS = (By.XPATH, '//button[@aria-controls="dropdown-basic" and @id="button-basic"]')
+PRINT_MENU_ITEM = (By.XPATH, '//a[@class="dropdown-item" and contains(text(), "พิมพ์ภาพแบบ/ภาพใบเสร็จ")]')
+DOWNLOAD_BUTTONS = (By.XPATH, '//button[contains(text(), "ดาวน์โหลด")]')
+MODAL_CLOSE_BUTTON = (By.XPATH, '//button[contains(@class, "btn button-box button-box-close-modal") and contains(text(), "ปิด")]')
+NEXT_PAGE_BUTTON = (By.XPATH, '//li[@title="หน้าถัดไป"]')
+
+# Stamps the first element matching a CSS selector and returns the stamp. When the
+# page re-renders, the element is replaced and a new stamp is returned.
+GENERATION_SCRIPT = """
+var marker = document.querySelector(arguments[0]);
+if (!marker) { return null; }
+if (!marker.dataset.efcGeneration) {
+    marker.dataset.efcGeneration = String(Date.now()) + '-' + Math.random().toString(36).slice(2);
+}
+return marker.dataset.efcGeneration;
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def dropdown_locator(form):
+    return (By.CSS_SELECTOR, f"ng-select[formcontrolname='{form}']")
+
+
+@functools.lru_cache(maxsize=None)
+def dropdown_option_locator(item):
+    return (By.XPATH, f"//span[@class='ng-option-label ng-star-inserted' and contains(text(), '{item}')]")
+
+
+@functools.lru_cache(maxsize=None)
+def input_locator(form):
+    return (By.XPATH, f"//input[@formcontrolname='{form}']")
+
+
+class BasePage:
+    """
+    Page object that caches element handles until the page re-renders.
+
+    Each page names a CSS selector for an element that is replaced whenever the
+    page content is rendered again. The selector's element is stamped with a
+    generation marker. Cached handles are dropped only when the marker changes or
+    an element turns out to be stale. WebDriver commands are counted by
+    DriverMetrics, which sees every command the driver sends.
+    """
+
+    MARKER_SELECTOR = None
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._elements = {}
+        self._generation = None
+
+    def refresh_if_changed(self):
+        """Drop cached handles if the page was rendered again. Returns True if it was."""
+        if self.MARKER_SELECTOR is None:
+            return False
+        generation = self.driver.execute_script(GENERATION_SCRIPT, self.MARKER_SELECTOR)
+        if generation is None or generation != self._generation:
+            self.invalidate()
+            self._generation = generation
+            return True
+        return False
+
+    def invalidate(self):
+        self._elements.clear()
+
+    def find(self, locator, condition=EC.visibility_of_element_located, cached=True):
+        """Wait for an element, reusing the cached handle when there is one."""
+        key = (condition, locator)
+        if cached and key in self._elements:
+            return self._elements[key]
+        element = WebDriverWait(self.driver, WAIT_TIMEOUT).until(condition(locator))
+        if cached:
+            self._elements[key] = element
+        return element
+
+    def find_all(self, locator, cached=True):
+        """Wait for all visible elements matching the locator, reusing the cached list when there is one."""
+        key = ('all', locator)
+        if cached and key in self._elements:
+            return self._elements[key]
+        elements = WebDriverWait(self.driver, WAIT_TIMEOUT).until(EC.visibility_of_all_elements_located(locator))
+        if cached:
+            self._elements[key] = elements
+        return elements
+
+    def click(self, element, locator=None, index=0):
+        """
+        Click an element, falling back to JavaScript when the click is intercepted.
+
+        A stale element is located again with the locator, using the index for
+        locators matching several elements.
+        """
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                element.click()
+                return
+            except ElementClickInterceptedException:
+                logging.warning(f"Attempt {attempt}: Click intercepted, clicking with JavaScript")
+                self.driver.execute_script("arguments[0].click();", element)
+                return
+            except StaleElementReferenceException:
+                logging.warning(f"Attempt {attempt}: Cached element is stale, locating it again")
+                self.invalidate()
+                if locator is None:
+                    raise
+                element = self.find_all(locator)[index]
+        raise RuntimeError(f"Failed to click element after {MAX_ATTEMPTS} attempts")
+
+
+class LoginPage(BasePage):
+    """Login form with the username and password fields."""
+
+    def login(self, username, password):
+        self.find(USERNAME_FIELD, EC.presence_of_element_located).send_keys(username)
+        password_field = self.find(PASSWORD_FIELD, EC.presence_of_element_located)
+        password_field.send_keys(password)
+        password_field.send_keys(Keys.RETURN)
+        WebDriverWait(self.driver, WAIT_TIMEOUT).until(EC.title_is(LOGGED_IN_TITLE))
+        self.invalidate()
+
+
+class FormStatusFilter(BasePage):
+    """Filter panel on the form-status page."""
+
+    MARKER_SELECTOR = "ng-select[formcontrolname]"
+
+    def open_panel(self):
+        self.refresh_if_changed()
+        self.click(self.find(FILTER_PANEL_TOGGLE, cached=False))
+
+    def select(self, form, item):
+        """Pick an item from an ng-select dropdown."""
+        self.click(self.find(dropdown_locator(form)), locator=dropdown_locator(form))
+        # Options are rendered only while the dropdown is open
+        self.click(self.find(dropdown_option_locator(item), cached=False))
+
+    def type(self, form, text):
+        self.find(input_locator(form)).send_keys(text)
+
+    def search(self):
+        self.click(self.find(SEARCH_BUTTON), locator=SEARCH_BUTTON)
+
+
+class ResultsTable(BasePage):
+    """Table of filed forms with one menu button per row and the pager below it."""
+
+    MARKER_SELECTOR = 'button#button-basic[aria-controls="dropdown-basic"]'
+
+    def row_buttons(self):
+        """Menu buttons of the rows on the current page, located once per page render."""
+        self.refresh_if_changed()
+        return self.find_all(ROW_MENU_BUTTONS)
+
+    def open_print_menu(self, index):
+        """Open a row's menu and choose the print form/receipt item."""
+        # Buttons cached by row_buttons() for this page, click() locates a stale one again
+        self.click(self.find_all(ROW_MENU_BUTTONS)[index], locator=ROW_MENU_BUTTONS, index=index)
+        # The menu is created for each row, so its item is never cached
+        self.click(self.find(PRINT_MENU_ITEM, EC.element_to_be_clickable, cached=False))
+
+    def next_page(self):
+        """Go to the next page. Returns False if there are no more pages."""
+        next_button = self.find(NEXT_PAGE_BUTTON, EC.element_to_be_clickable, cached=False)
+        if "disabled" in next_button.get_attribute("class"):
+            return False
+        self.click(next_button)
+        self.invalidate()
+        return True
+
+
+class DownloadModal(BasePage):
+    """Modal listing the download buttons of one filed form."""
+
+    MARKER_SELECTOR = "button.button-box-close-modal"
+
+    def download_buttons(self):
+        self.refresh_if_changed()
+        return self.find_all(DOWNLOAD_BUTTONS)
+
+    def download(self, index):
+        # Buttons stay cached while the modal is open, close() drops them
+        self.click(self.find_all(DOWNLOAD_BUTTONS)[index], locator=DOWNLOAD_BUTTONS, index=index)
+
+    def close(self):
+        self.click(self.find(MODAL_CLOSE_BUTTON, EC.element_to_be_clickable), locator=MODAL_CLOSE_BUTTON)
+        self.invalidate()
+
+
+class EFilingPages:
+    """The page objects of one browser session."""
+
+    def __init__(self, driver=None):
+        self.login = LoginPage(driver)
+        self.filter = FormStatusFilter(driver)
+        self.results = ResultsTable(driver)
+        self.modal = DownloadModal(driver)
+
+    def attach(self, driver):
+        """Point every page at a newly started browser."""
+        for page in (self.login, self.filter, self.results, self.modal):
+            page.driver = driver
+            page.invalidate()
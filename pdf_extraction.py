@@ -0,0 +1,400 @@
+"""
+Extract tax data from stored PDFs into batched columnar files.
+
+The controller submits every stored file when EFILLING_EXTRACT=1. Files stored
+before that can be processed from the catalog:
+
+    python pdf_extraction.py --catalog ~/Downloads/EFillingController/filings_catalog.sqlite --form PP30 --form PND53
+
+Text comes from pypdf when it is installed, otherwise from a best-effort reader
+of the PDF content streams. Batches are written as Parquet when pyarrow is
+installed, otherwise as CSV part files with the same columns.
+"""
+import argparse
+import concurrent.futures
+import csv
+import io
+import itertools
+import logging
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import zlib
+
+from download_output import read_stored_file
+
+# Constants
+BATCH_SIZE = 200
+PROCESSED_FILENAME = "processed.txt"
+WORKER_NICENESS = 10
+
+FIELDS = ("tax_id", "period", "tax_amount", "surcharge", "receipt_number")
+COLUMNS = FIELDS + (
+    "location", "company_name", "username", "form_code", "kind", "tax_year", "tax_month",
+    "sha256", "extractor", "text_chars", "error",
+)
+
+THAI_MONTHS = (
+    "มกราคม", "กุมภาพันธ์", "มีนาคม", "เมษายน", "พฤษภาคม", "มิถุนายน",
+    "กรกฎาคม", "สิงหาคม", "กันยายน", "ตุลาคม", "พฤศจิกายน", "ธันวาคม",
+)
+AMOUNT = r"([\d,]+\.\d{2})"
+
+# Labels printed before each amount, most specific first
+DEFAULT_LABELS = {
+    'tax_amount': ("ภาษีที่ต้องชำระ", "ภาษีที่นำส่ง", "จำนวนเงินภาษี", "Tax Amount"),
+    'surcharge': ("เงินเพิ่ม", "Surcharge"),
+}
+FORM_LABELS = {
+    'PP30': {
+        'tax_amount': ("ภาษีสุทธิที่ต้องชำระ", "ภาษีที่ต้องชำระ", "Net Tax Payable", "Tax Amount"),
+    },
+    'PND3': {
+        'tax_amount': ("รวมยอดภาษีที่นำส่ง", "ยอดภาษีที่นำส่ง", "ภาษีที่นำส่ง", "Tax Amount"),
+    },
+    'PND53': {
+        'tax_amount': ("รวมยอดภาษีที่นำส่ง", "ยอดภาษีที่นำส่ง", "ภาษีที่นำส่ง", "Tax Amount"),
+    },
+}
+
+TAX_ID_PATTERN = re.compile(r"(?<!\d)(\d[-\s]?\d{4}[-\s]?\d{5}[-\s]?\d{2}[-\s]?\d)(?!\d)")
+RECEIPT_NUMBER_PATTERN = re.compile(r"(?:เลขที่ใบเสร็จ(?:รับเงิน)?|Receipt No\.?)\s*[:：]?\s*([A-Za-z0-9][A-Za-z0-9\-/]*)")
+THAI_PERIOD_PATTERN = re.compile(r"(" + "|".join(THAI_MONTHS) + r")\s*(?:พ\.ศ\.)?\s*(\d{4})")
+NUMERIC_PERIOD_PATTERN = re.compile(r"(?<![\d/])(\d{1,2})/(\d{4})(?![\d/])")
+
+STREAM_PATTERN = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.DOTALL)
+TEXT_OPERATOR_PATTERN = re.compile(rb"(\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]+>|\[.*?\])\s*(?:Tj|TJ|'|\")", re.DOTALL)
+STRING_PATTERN = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]+>")
+ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+
+
+def amount_patterns(labels):
+    return tuple(re.compile(re.escape(label) + r"[^\d\n]{0,40}?" + AMOUNT) for label in labels)
+
+
+DEFAULT_PATTERNS = {field: amount_patterns(labels) for field, labels in DEFAULT_LABELS.items()}
+FORM_PATTERNS = {
+    form: dict(DEFAULT_PATTERNS, **{field: amount_patterns(labels) for field, labels in overrides.items()})
+    for form, overrides in FORM_LABELS.items()
+}
+
+
+def decode_string(token):
+    """Decode a literal or hex PDF string operand."""
+    if token.startswith(b"<"):
+        digits = re.sub(rb"\s", b"", token[1:-1])
+        data = bytes.fromhex(digits.decode() + ("0" if len(digits) % 2 else ""))
+        # Two-byte codes are usually UTF-16 in files written with a Unicode font
+        if data[:2] == b"\xfe\xff" or (len(data) % 2 == 0 and data[:1] == b"\x00"):
+            return data.decode("utf-16-be", errors="ignore").lstrip("\ufeff")
+        return data.decode("latin-1")
+
+    body = token[1:-1]
+    body = re.sub(rb"\\([nrtbf])", lambda m: ESCAPES[m.group(1)], body)
+    body = re.sub(rb"\\([0-7]{1,3})", lambda m: bytes([int(m.group(1), 8) & 0xFF]), body)
+    body = re.sub(rb"\\(.)", rb"\1", body, flags=re.DOTALL)
+    if body[:2] == b"\xfe\xff":
+        return body[2:].decode("utf-16-be", errors="ignore")
+    return body.decode("utf-8", errors="ignore") if _is_utf8(body) else body.decode("latin-1")
+
+
+def _is_utf8(data):
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def extract_text_stdlib(data):
+    """
+    Best-effort text of a PDF using only the standard library.
+
+    Reads the strings shown by text operators in every content stream. Text
+    drawn with embedded subset fonts has no Unicode mapping here and is lost.
+    """
+    lines = []
+    for match in STREAM_PATTERN.finditer(data):
+        content = match.group(1)
+        try:
+            content = zlib.decompress(content)
+        except zlib.error:
+            pass
+        for operator in TEXT_OPERATOR_PATTERN.finditer(content):
+            operand = operator.group(1)
+            if operand.startswith(b"["):
+                lines.append("".join(decode_string(token) for token in STRING_PATTERN.findall(operand)))
+            else:
+                lines.append(decode_string(operand))
+    return "\n".join(lines)
+
+
+def extract_text(data):
+    """
+    Text of a PDF.
+
+    Returns:
+        tuple: (text, name of the extractor used)
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return extract_text_stdlib(data), "stdlib"
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join(page.extract_text() or "" for page in reader.pages), "pypdf"
+
+
+def parse_amount(text):
+    return float(text.replace(",", ""))
+
+
+def parse_period(text):
+    """Tax period as YYYY-MM from a Thai month name or MM/YYYY, with Buddhist years converted."""
+    match = THAI_PERIOD_PATTERN.search(text)
+    if match:
+        month, year = THAI_MONTHS.index(match.group(1)) + 1, int(match.group(2))
+    else:
+        match = NUMERIC_PERIOD_PATTERN.search(text)
+        if not match or not 1 <= int(match.group(1)) <= 12:
+            return None
+        month, year = int(match.group(1)), int(match.group(2))
+    if year > 2400:
+        year -= 543
+    return f"{year}-{month:02d}"
+
+
+def parse_fields(text, form_code=None):
+    """
+    Parse the key fields of a tax form or receipt.
+
+    Args:
+        text (str): Extracted text of the PDF.
+        form_code (str): Form code such as PP30 or PND53, selecting the amount labels.
+
+    Returns:
+        dict: Value of every field in FIELDS, None where it was not found.
+    """
+    text = re.sub(r"[ \t\u00a0]+", " ", text)
+    fields = dict.fromkeys(FIELDS)
+
+    match = TAX_ID_PATTERN.search(text)
+    if match:
+        fields['tax_id'] = re.sub(r"\D", "", match.group(1))
+    fields['period'] = parse_period(text)
+    match = RECEIPT_NUMBER_PATTERN.search(text)
+    if match:
+        fields['receipt_number'] = match.group(1)
+
+    for field, patterns in FORM_PATTERNS.get(form_code, DEFAULT_PATTERNS).items():
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match:
+                fields[field] = parse_amount(match.group(1))
+                break
+    return fields
+
+
+def extract_fields(location, form_code=None):
+    """
+    Extract the key fields of one stored PDF.
+
+    Runs in a worker process, so it only returns plain values.
+
+    Args:
+        location (str): Path or archive location of the PDF.
+        form_code (str): Form code of the PDF.
+
+    Returns:
+        dict: Parsed fields plus 'extractor', 'text_chars' and 'error'.
+    """
+    try:
+        text, extractor = extract_text(read_stored_file(location))
+    except Exception as e:
+        return dict(dict.fromkeys(FIELDS), extractor=None, text_chars=0, error=f"{type(e).__name__}: {e}")
+    return dict(parse_fields(text, form_code), extractor=extractor, text_chars=len(text), error=None)
+
+
+def lower_priority():
+    """Run extraction workers below the browsers and the controller."""
+    if hasattr(os, "nice"):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError:
+            pass
+
+
+class ColumnarWriter:
+    """Write record batches as separate Parquet part files, or CSV part files without pyarrow."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._prefix = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        self._sequence = itertools.count(1)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            self._pyarrow = pyarrow
+            self.format = "parquet"
+        except ImportError:
+            self._pyarrow = None
+            self.format = "csv"
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records):
+        """Write one batch. Returns the path of the part file."""
+        path = os.path.join(self.directory, f"{self._prefix}-{next(self._sequence):05d}.{self.format}")
+        partial_path = f"{path}.part"
+        columns = {column: [record.get(column) for record in records] for column in COLUMNS}
+        if self._pyarrow is not None:
+            self._pyarrow.parquet.write_table(self._pyarrow.table(columns), partial_path)
+        else:
+            with open(partial_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+                writer.writerows(zip(*(columns[column] for column in COLUMNS)))
+        # Readers never see a half written part
+        os.replace(partial_path, path)
+        return path
+
+
+class PdfExtractionQueue:
+    """
+    Extract tax data from stored PDFs in a process pool while downloads continue.
+
+    Results are buffered and written BATCH_SIZE at a time. A file's location is
+    added to processed.txt only after its batch is written, so a crash never
+    marks a file as processed without its data, and files already listed are
+    skipped on later runs. Files whose extraction failed are written with their
+    error but not listed, so they are tried again. Workers run at a lower
+    priority than the browsers.
+    """
+
+    def __init__(self, output_directory, max_workers=None, batch_size=BATCH_SIZE):
+        self.output_directory = output_directory
+        self.batch_size = batch_size
+        self.writer = ColumnarWriter(output_directory)
+        self.processed_path = os.path.join(output_directory, PROCESSED_FILENAME)
+        self.processed = set()
+        if os.path.exists(self.processed_path):
+            with open(self.processed_path, encoding="utf-8") as f:
+                self.processed = {line.rstrip("\n") for line in f if line.strip()}
+        self.extracted = 0
+        self._buffer = []
+        self._queued = set()
+        # Leave most of the CPU to the browsers
+        max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=lower_priority)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def submit(self, location, metadata=None):
+        """
+        Queue a stored PDF for extraction without waiting for the result.
+
+        Args:
+            location (str): Location returned by the output backend's commit.
+            metadata (dict): File metadata, copied into the record.
+
+        Returns:
+            bool: False if the file was already processed or queued.
+        """
+        metadata = metadata or {}
+        with self._lock:
+            if location in self.processed or location in self._queued:
+                return False
+            self._queued.add(location)
+            self._pending += 1
+        future = self._pool.submit(extract_fields, location, metadata.get('form_code'))
+        future.add_done_callback(lambda done: self._on_extracted(location, metadata, done))
+        return True
+
+    def _on_extracted(self, location, metadata, future):
+        try:
+            fields = future.result()
+        except Exception as e:
+            fields = dict(dict.fromkeys(FIELDS), extractor=None, text_chars=0, error=f"extraction failed: {e}")
+        if fields['error']:
+            logging.warning(f"Failed to extract text from {location}: {fields['error']}")
+
+        record = {column: metadata.get(column) for column in COLUMNS}
+        record.update(fields, location=location)
+        with self._lock:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def _flush_locked(self):
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        extracted = [record['location'] for record in batch if not record['error']]
+        try:
+            path = self.writer.write(batch)
+            with open(self.processed_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{location}\n" for location in extracted)
+        except Exception as e:
+            logging.error(f"Failed to write extracted data: {e}")
+            self._queued.difference_update(record['location'] for record in batch)
+            return
+        self.processed.update(extracted)
+        self._queued.difference_update(record['location'] for record in batch)
+        self.extracted += len(batch)
+        logging.info(f"Wrote {len(batch)} extracted records to {path}")
+
+    def flush(self):
+        """Write the buffered records now."""
+        with self._lock:
+            self._flush_locked()
+
+    def join(self):
+        """Block until every submitted file is extracted."""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def close(self):
+        """Wait for outstanding extractions, write the last batch and shut down the pool."""
+        logging.info("Waiting for PDF text extraction to finish...")
+        self.join()
+        self.flush()
+        self._pool.shutdown()
+        logging.info(f"PDF text extraction finished: {self.extracted} files written as {self.writer.format}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main(argv=None):
+    from catalog import FilingsCatalog
+
+    parser = argparse.ArgumentParser(description="Extract tax data from the PDFs listed in the filings catalog.")
+    parser.add_argument("--catalog", required=True)
+    parser.add_argument("--output", help="directory of the part files, 'extracted' next to the catalog by default")
+    parser.add_argument("--form", action="append", help="only these form codes, for example PP30, PND3 or PND53")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(args.catalog)), "extracted")
+    entries = FilingsCatalog(args.catalog).find()
+    if args.form:
+        entries = [entry for entry in entries if entry['form_code'] in args.form]
+
+    with PdfExtractionQueue(output, max_workers=args.workers, batch_size=args.batch_size) as extractor:
+        queued = sum(extractor.submit(entry['location'], entry) for entry in entries)
+    logging.info(f"Extracted {queued} of {len(entries)} catalogued files into {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
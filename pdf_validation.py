@@ -0,0 +1,249 @@
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# Constants
+MIN_PDF_SIZE = 1024
+EOF_SEARCH_BYTES = 2048
+MAX_REPAIR_ATTEMPTS = 3
+REDOWNLOAD_WORKERS = 2
+STORE_WORKERS = 2
+DOWNLOAD_TIMEOUT = 30  # seconds without data before a download is dropped
+DOWNLOAD_DEADLINE = 120  # seconds a whole download may take
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+PDF_HEADER = b"%PDF-"
+PDF_EOF = b"%%EOF"
+PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+OBJECT_STREAM_PATTERN = re.compile(rb"/Type\s*/ObjStm")
+
+
+def validate_pdf(path, min_size=MIN_PDF_SIZE):
+    """
+    Check that a downloaded file is a complete PDF.
+
+    Runs in a worker process, so it only uses the standard library and
+    returns a plain dictionary.
+
+    Args:
+        path (str): Path of the downloaded file.
+        min_size (int): Smallest size in bytes accepted as a real PDF.
+
+    Returns:
+        dict: Validation result with 'valid', 'reason', 'size' and 'pages'.
+    """
+    result = {'path': path, 'valid': False, 'reason': None, 'size': 0, 'pages': None}
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        result['reason'] = f"unreadable: {e}"
+        return result
+
+    result['size'] = len(data)
+
+    # The PDF header may be preceded by junk, but must be in the first 1024 bytes
+    if data.find(PDF_HEADER, 0, 1024) < 0:
+        if data.lstrip()[:1] == b"<":
+            result['reason'] = "html page instead of pdf"
+        else:
+            result['reason'] = "missing %PDF header"
+        return result
+
+    if data.rfind(PDF_EOF, max(0, len(data) - EOF_SEARCH_BYTES)) < 0:
+        result['reason'] = "missing %%EOF marker, file truncated"
+        return result
+
+    # Page objects can be hidden inside compressed object streams, in which case the count is unknown
+    pages = len(PAGE_PATTERN.findall(data))
+    if pages == 0 and not OBJECT_STREAM_PATTERN.search(data):
+        result['reason'] = "no pages found"
+        return result
+    result['pages'] = pages or None
+
+    if len(data) < min_size:
+        result['reason'] = f"file smaller than {min_size} bytes"
+        return result
+
+    result['valid'] = True
+    return result
+
+
+def fetch_url(url, path, timeout=DOWNLOAD_TIMEOUT, deadline=DOWNLOAD_DEADLINE):
+    """
+    Download a URL into a file, giving up on a stalled or endless transfer.
+
+    Args:
+        url (str): URL to download.
+        path (str): Path of the file to write.
+        timeout (float): Seconds to wait for the connection or the next chunk.
+        deadline (float): Seconds the whole transfer may take.
+
+    Returns:
+        None
+    """
+    import urllib.request  # Pulls in http.client and ssl, only needed once a file is downloaded
+
+    started = time.monotonic()
+    with urllib.request.urlopen(url, timeout=timeout) as response, open(path, 'wb') as f:
+        for chunk in iter(lambda: response.read(DOWNLOAD_CHUNK_SIZE), b""):
+            f.write(chunk)
+            if time.monotonic() - started > deadline:
+                raise TimeoutError(f"download of {url} took longer than {deadline}s")
+
+
+def redownload_pdf(url, path):
+    """
+    Download the PDF again, replacing the file only once the transfer completes.
+
+    Args:
+        url (str): PDF URL recorded when the file was first downloaded.
+        path (str): Path of the file to replace.
+
+    Returns:
+        None
+    """
+    partial_path = f"{path}.part"
+    try:
+        fetch_url(url, partial_path)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+class PdfValidationQueue:
+    """
+    Validate downloaded PDFs in a process pool while the browser keeps working.
+
+    Files that fail validation are downloaded again on a background thread and
+    validated once more, up to MAX_REPAIR_ATTEMPTS times. Valid files are handed
+    to on_valid on separate store threads, so slow storage never holds up the
+    results of other files. Every final result is appended to the report file
+    together with the metadata given on submit.
+    """
+
+    def __init__(self, report_path=None, max_workers=None, min_size=MIN_PDF_SIZE, max_repairs=MAX_REPAIR_ATTEMPTS):
+        self.report_path = report_path
+        self.min_size = min_size
+        self.max_repairs = max_repairs
+        self.results = []
+        self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        self._downloader = concurrent.futures.ThreadPoolExecutor(max_workers=REDOWNLOAD_WORKERS)
+        self._storer = concurrent.futures.ThreadPoolExecutor(max_workers=STORE_WORKERS)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def submit(self, url, path, metadata=None, on_valid=None, on_invalid=None):
+        """
+        Queue a downloaded file for validation without waiting for the result.
+
+        Args:
+            url (str): URL the file was downloaded from, used for repairs.
+            path (str): Path of the downloaded file.
+            metadata (dict): Extra information recorded with the result.
+            on_valid (callable): Called with the result once the file is valid.
+            on_invalid (callable): Called with the result once the file failed every repair.
+
+        Returns:
+            None
+        """
+        logging.info(f"Queueing PDF for validation: {path}")
+        entry = {'url': url, 'path': path, 'metadata': metadata or {}, 'on_valid': on_valid, 'on_invalid': on_invalid, 'repairs': 0}
+        with self._lock:
+            self._pending += 1
+        self._validate(entry)
+
+    def _validate(self, entry):
+        try:
+            future = self._pool.submit(validate_pdf, entry['path'], self.min_size)
+        except Exception as e:
+            # Process pool is unavailable, validate on the downloader thread instead
+            logging.warning(f"Validation process pool unavailable: {e}, validating in thread")
+            future = self._downloader.submit(validate_pdf, entry['path'], self.min_size)
+        future.add_done_callback(lambda done: self._on_validated(entry, done))
+
+    def _on_validated(self, entry, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'path': entry['path'], 'valid': False, 'reason': f"validator failed: {e}", 'size': 0, 'pages': None}
+
+        if result['valid']:
+            logging.info(f"PDF validated successfully: {entry['path']}")
+            # Runs on the pool's result thread, storing the file here would delay every other result
+            self._storer.submit(self._store, entry, result)
+            return
+
+        if entry['repairs'] < self.max_repairs and entry['url']:
+            entry['repairs'] += 1
+            logging.warning(f"Invalid PDF {entry['path']} ({result['reason']}), re-downloading attempt {entry['repairs']}")
+            self._downloader.submit(self._repair, entry)
+            return
+
+        logging.error(f"PDF failed validation after {entry['repairs']} repairs: {entry['path']} ({result['reason']})")
+        self._storer.submit(self._store, entry, result)
+
+    def _store(self, entry, result):
+        callback = entry['on_valid'] if result['valid'] else entry['on_invalid']
+        try:
+            if callback is not None:
+                callback(result)
+        except Exception as e:
+            logging.error(f"Error handling validated PDF {entry['path']}: {e}")
+        self._finish(entry, result)
+
+    def _repair(self, entry):
+        try:
+            redownload_pdf(entry['url'], entry['path'])
+        except Exception as e:
+            logging.warning(f"Failed to re-download PDF {entry['path']}: {e}")
+        self._validate(entry)
+
+    def _finish(self, entry, result):
+        record = dict(entry['metadata'])
+        record.update(result)
+        record['url'] = entry['url']
+        record['repairs'] = entry['repairs']
+        record['checked_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+
+        with self._lock:
+            self.results.append(record)
+            if self.report_path:
+                try:
+                    os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+                    with open(self.report_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except Exception as e:
+                    logging.error(f"Failed to write validation report: {e}")
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def join(self):
+        """Block until every submitted file has a final validation result."""
+        with self._idle:
+            while self._pending:
+                self._idle.wait()
+
+    def close(self):
+        """Wait for outstanding validations and shut down the worker pools."""
+        logging.info("Waiting for PDF validation to finish...")
+        self.join()
+        self._pool.shutdown()
+        self._downloader.shutdown()
+        self._storer.shutdown()
+        failed = sum(1 for record in self.results if not record['valid'])
+        logging.info(f"PDF validation finished: {len(self.results)} checked, {failed} invalid")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
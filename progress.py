@@ -0,0 +1,239 @@
+import collections
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+# Constants
+STATUS_PORT = int(os.environ.get("EFILLING_STATUS_PORT", "0"))
+PROGRESS_LOG_INTERVAL = int(os.environ.get("EFILLING_PROGRESS_INTERVAL", "60"))
+RATE_WINDOW = 300
+QUEUE_COUNTS_MAX_AGE = 2.0
+
+
+class ProgressTracker:
+    """
+    Track progress of a run and estimate when it will finish.
+
+    Job totals come from the queue, so with a shared SQLite queue they cover the
+    workers on every host. Phases, files and bytes are only known for workers
+    in this process. The ETA divides the remaining jobs by the number of jobs
+    running, scaled by the mean duration of the jobs finished here.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.started = time.time()
+        self.workers = {}
+        self.files = 0
+        self.bytes = 0
+        self.job_seconds = []
+        self.jobs_finished = collections.Counter()
+        self._recent = collections.deque()
+        self._counts = None
+        self._counts_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def start(self, status_port=STATUS_PORT, log_interval=PROGRESS_LOG_INTERVAL):
+        """Start the HTTP status endpoint and the periodic progress log line, if enabled."""
+        if status_port:
+            # http.server is only imported when the endpoint is enabled, it is slow to load
+            from http.server import ThreadingHTTPServer
+            self._server = ThreadingHTTPServer(("127.0.0.1", status_port), status_handler())
+            self._server.tracker = self
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="progress-http", daemon=True))
+            logging.info(f"Progress status available at http://127.0.0.1:{self._server.server_address[1]}/")
+        if log_interval:
+            self._threads.append(threading.Thread(target=self._log_loop, args=(log_interval,), name="progress-log", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        logging.info(self.describe())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def job_started(self, worker_id, label):
+        with self._lock:
+            self.workers[worker_id] = {'job': label, 'phase': "starting", 'job_started': time.time(), 'files': 0}
+
+    def job_finished(self, worker_id, succeeded):
+        with self._lock:
+            worker = self.workers.get(worker_id)
+            if worker is not None:
+                self.job_seconds.append(time.time() - worker['job_started'])
+                worker.update(job=None, phase="idle", job_started=None)
+            self.jobs_finished["done" if succeeded else "failed"] += 1
+            self._counts = None
+
+    def set_phase(self, worker_id, phase):
+        with self._lock:
+            if worker_id in self.workers:
+                self.workers[worker_id]['phase'] = phase
+
+    def file_downloaded(self, worker_id, path):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        now = time.time()
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            if worker_id in self.workers:
+                self.workers[worker_id]['files'] += 1
+            self._recent.append((now, size))
+            while self._recent and self._recent[0][0] < now - RATE_WINDOW:
+                self._recent.popleft()
+
+    def observer(self, worker_id):
+        """Job observer that reports the worker's phases and downloaded files."""
+        return _WorkerProgress(self, worker_id)
+
+    def queue_counts(self):
+        # Counting a shared queue opens a SQLite transaction, so reuse recent counts
+        with self._lock:
+            if self._counts is not None and time.time() - self._counts_at < QUEUE_COUNTS_MAX_AGE:
+                return dict(self._counts)
+        counts = self.queue.counts()
+        with self._lock:
+            self._counts, self._counts_at = counts, time.time()
+        return dict(counts)
+
+    def snapshot(self):
+        """
+        Current progress of the run.
+
+        Returns:
+            dict: Job counts, worker phases, transfer rates and the ETA.
+        """
+        counts = self.queue_counts()
+        now = time.time()
+        with self._lock:
+            elapsed = now - self.started
+            window = min(elapsed, RATE_WINDOW)
+            recent_files = len(self._recent)
+            recent_bytes = sum(size for _, size in self._recent)
+            mean_job_seconds = sum(self.job_seconds) / len(self.job_seconds) if self.job_seconds else None
+            workers = {
+                worker_id: {
+                    'job': worker['job'],
+                    'phase': worker['phase'],
+                    'job_seconds': round(now - worker['job_started'], 1) if worker['job_started'] else None,
+                    'files': worker['files'],
+                }
+                for worker_id, worker in self.workers.items()
+            }
+            files, total_bytes = self.files, self.bytes
+            finished_here = dict(self.jobs_finished)
+
+        remaining = counts.get('pending', 0) + counts.get('running', 0)
+        eta_seconds = None
+        if mean_job_seconds is not None:
+            eta_seconds = remaining * mean_job_seconds / max(1, counts.get('running', 0))
+
+        return {
+            'elapsed_s': round(elapsed, 1),
+            'jobs': counts,
+            'jobs_finished_here': finished_here,
+            'workers': workers,
+            'files': files,
+            'bytes': total_bytes,
+            'files_per_s': files / elapsed if elapsed else 0.0,
+            'bytes_per_s': total_bytes / elapsed if elapsed else 0.0,
+            'recent_files_per_s': recent_files / window if window else 0.0,
+            'recent_bytes_per_s': recent_bytes / window if window else 0.0,
+            'mean_job_s': mean_job_seconds,
+            'eta_s': eta_seconds,
+        }
+
+    def describe(self):
+        """One line summary of the snapshot for the activity log."""
+        status = self.snapshot()
+        jobs = status['jobs']
+        eta = format_duration(status['eta_s']) if status['eta_s'] is not None else "unknown"
+        phases = ", ".join(f"{worker_id}: {worker['phase']}" for worker_id, worker in status['workers'].items())
+        return (f"Progress: {jobs.get('done', 0)} done, {jobs.get('running', 0)} running, {jobs.get('pending', 0)} pending, "
+                f"{jobs.get('failed', 0)} failed | {status['files']} files, {status['recent_files_per_s'] * 60:.1f} files/min, "
+                f"{status['recent_bytes_per_s'] / 1024:.1f} KiB/s | ETA {eta} | {phases}")
+
+    def _log_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                logging.info(self.describe())
+            except Exception as e:
+                logging.error("Failed to report progress: %s", e)
+
+
+class _WorkerProgress:
+    """Job observer forwarding one worker's phases and files to the tracker."""
+
+    def __init__(self, tracker, worker_id):
+        self.tracker = tracker
+        self.worker_id = worker_id
+
+    def driver_started(self, driver):
+        pass
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self.tracker.set_phase(self.worker_id, name)
+        yield
+
+    def file_downloaded(self, path):
+        self.tracker.file_downloaded(self.worker_id, path)
+
+
+@functools.lru_cache(maxsize=None)
+def status_handler():
+    """Request handler class of the status endpoint, defined on first use."""
+    from http.server import BaseHTTPRequestHandler
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        """Serves the progress snapshot as JSON on / and as one line of text on /text."""
+
+        def do_GET(self):
+            tracker = self.server.tracker
+            if self.path.rstrip("/") == "/text":
+                body = (tracker.describe() + "\n").encode("utf-8")
+                content_type = "text/plain; charset=utf-8"
+            elif self.path in ("/", "/status"):
+                body = json.dumps(tracker.snapshot(), ensure_ascii=False, indent=2).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug("Status request: " + format, *args)
+
+    return StatusHandler
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,82 @@
+import logging
+import time
+
+from instrumentation import job_phase
+
+
+class TabTask:
+    """
+    Work running in one browser tab.
+
+    steps is a generator that does one step of the work per resume and yields
+    (phase of the next step, seconds to wait before it). The wait is spent in
+    other tabs instead of sleeping.
+    """
+
+    def __init__(self, handle, steps, phase, observers=None, context=None):
+        self.handle = handle
+        self.steps = steps
+        self.phase = phase
+        self.observers = observers or []
+        self.context = context
+        self.ready_at = 0.0
+
+
+class TabScheduler:
+    """
+    Interleave tasks across the tabs of one browser, round-robin.
+
+    Only one tab can be driven at a time, so the scheduler switches to a task's
+    tab, runs its next step and moves on to the next task that is ready. When a
+    task ends, on_finished(task, error) is called with the exception it raised or
+    None. It may return a new task to run, typically in the same tab.
+    """
+
+    def __init__(self, driver, on_finished):
+        self.driver = driver
+        self.on_finished = on_finished
+        self.tasks = []
+        self._current_handle = None
+        self._next_index = 0
+
+    def add(self, task):
+        self.tasks.append(task)
+
+    def _next_ready(self):
+        """The next task in round-robin order that is ready, waiting for the earliest one if none is."""
+        count = len(self.tasks)
+        for offset in range(count):
+            index = (self._next_index + offset) % count
+            if self.tasks[index].ready_at <= time.monotonic():
+                self._next_index = index + 1
+                return self.tasks[index]
+        task = min(self.tasks, key=lambda task: task.ready_at)
+        time.sleep(max(0.0, task.ready_at - time.monotonic()))
+        self._next_index = self.tasks.index(task) + 1
+        return task
+
+    def run(self):
+        """Run until every task has finished."""
+        while self.tasks:
+            task = self._next_ready()
+            if task.handle != self._current_handle:
+                self.driver.switch_to.window(task.handle)
+                self._current_handle = task.handle
+
+            try:
+                with job_phase(task.observers, task.phase):
+                    task.phase, delay = next(task.steps)
+            except StopIteration:
+                self._finish(task, None)
+                continue
+            except Exception as e:
+                logging.error(f"Tab task failed in phase {task.phase}: {e}")
+                self._finish(task, e)
+                continue
+            task.ready_at = time.monotonic() + delay
+
+    def _finish(self, task, error):
+        self.tasks.remove(task)
+        replacement = self.on_finished(task, error)
+        if replacement is not None:
+            self.tasks.append(replacement)
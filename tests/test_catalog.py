@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from catalog import FilingsCatalog, file_digest, main, period_of
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return FilingsCatalog(str(tmp_path / "catalog.sqlite"))
+
+
+def add(catalog, location, company="ACME CO", form_code="PND53", kind="RECEIPT", year="2024", month="MAR", **metadata):
+    metadata.update(company_name=company, form_code=form_code, kind=kind, tax_year=year, tax_month=month)
+    catalog.add(location, metadata)
+
+
+@pytest.mark.parametrize("tax_year, tax_month, period", [
+    ("2024", "MAR", "2024-03"),
+    ("2024", "dec", "2024-12"),
+    (2024, "JAN", "2024-01"),
+    ("2024", "มี.ค.", None),
+    ("2567?", "MAR", None),
+    (None, "MAR", None),
+    ("2024", None, None),
+])
+def test_period_of(tax_year, tax_month, period):
+    assert period_of(tax_year, tax_month) == period
+
+
+def test_file_digest(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"abc")
+    assert file_digest(str(path)) == (3, "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad")
+
+
+def test_find_filters(catalog):
+    add(catalog, "a.pdf")
+    add(catalog, "b.pdf", kind="TAX_FORM")
+    add(catalog, "c.pdf", month="APR", penalty=True)
+    add(catalog, "d.pdf", company="OTHER CO", form_code="PP30", year="2023")
+
+    assert [entry['location'] for entry in catalog.find()] == ["a.pdf", "b.pdf", "c.pdf", "d.pdf"]
+    assert [entry['location'] for entry in catalog.find(company="ACME CO", kind="RECEIPT")] == ["a.pdf", "c.pdf"]
+    assert [entry['location'] for entry in catalog.find(period="2024-03")] == ["a.pdf", "b.pdf"]
+    assert [entry['location'] for entry in catalog.find(year="2023")] == ["d.pdf"]
+    assert [entry['location'] for entry in catalog.find(penalty=True)] == ["c.pdf"]
+    assert catalog.find(form_code="PP30")[0]['period'] == "2023-03"
+
+
+def test_add_replaces_entry_of_same_location(catalog):
+    add(catalog, "a.pdf", size=1)
+    add(catalog, "a.pdf", size=2)
+    assert [entry['size'] for entry in catalog.find()] == [2]
+
+
+def test_gaps_ignore_penalties_and_other_kinds(catalog):
+    add(catalog, "a.pdf", month="JAN")
+    add(catalog, "b.pdf", month="FEB", penalty=True)
+    add(catalog, "c.pdf", month="MAR", kind="TAX_FORM")
+    add(catalog, "d.pdf", company="OTHER CO", month="JAN", year="2023")
+
+    missing = catalog.gaps("2024", kind="RECEIPT")
+    assert ("ACME CO", "2024-01") not in missing
+    assert ("ACME CO", "2024-02") in missing and ("ACME CO", "2024-03") in missing
+    assert [period for company, period in missing if company == "OTHER CO"] == [f"2024-{month:02d}" for month in range(1, 13)]
+    assert len(catalog.gaps("2024", company="ACME CO")) == 10
+
+
+def test_has_url(catalog):
+    add(catalog, "a.pdf", url="https://example.test/a")
+    assert catalog.has_url("https://example.test/a")
+    assert not catalog.has_url("https://example.test/b")
+    assert not catalog.has_url(None)
+
+
+def test_duplicates(catalog):
+    add(catalog, "a.pdf", sha256="same")
+    add(catalog, "b.pdf", sha256="same")
+    add(catalog, "c.pdf", sha256="other")
+    add(catalog, "d.pdf")
+    assert catalog.duplicates() == [["a.pdf", "b.pdf"]]
+
+
+def test_shared_between_instances(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    add(FilingsCatalog(path), "a.pdf", url="https://example.test/a")
+    assert FilingsCatalog(path).has_url("https://example.test/a")
+
+
+def test_cli_find_json(catalog, capsys):
+    add(catalog, "a.pdf")
+    assert main(["--catalog", catalog.path, "--json", "find", "--form", "PND53"]) == 0
+    assert [entry['location'] for entry in json.loads(capsys.readouterr().out)] == ["a.pdf"]
+
+
+def test_cli_gaps(catalog, capsys):
+    add(catalog, "a.pdf")
+    main(["--catalog", catalog.path, "gaps", "--year", "2024"])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 11 and "ACME CO\t2024-03" not in lines
@@ -0,0 +1,167 @@
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from download_output import (MANIFEST_FILENAME, REJECTED_DIRECTORY, ArchiveOutput, FolderOutput, create_output, file_lock,
+                             read_stored_file, unique_member_name)
+
+
+def download(directory, filename, content=b"%PDF-1.4 broken"):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_folder_reject_moves_file_out_of_company_folder(tmp_path):
+    output = create_output("folder", str(tmp_path))
+    directory = str(tmp_path / "Company" / "YEAR 2024" / "3.MAR-2024")
+    staged_path = download(directory, "RECEIPT_1.pdf")
+
+    location = output.reject(directory, "RECEIPT_1.pdf", staged_path)
+
+    assert location == str(tmp_path / REJECTED_DIRECTORY / "Company" / "YEAR 2024" / "3.MAR-2024" / "RECEIPT_1.pdf")
+    assert os.path.exists(location)
+    assert os.listdir(directory) == []
+
+
+def test_folder_reject_keeps_earlier_rejected_files(tmp_path):
+    output = FolderOutput(str(tmp_path))
+    directory = str(tmp_path / "Company")
+    first = output.reject(directory, "RECEIPT_1.pdf", download(directory, "RECEIPT_1.pdf"))
+    second = output.reject(directory, "RECEIPT_1.pdf", download(directory, "RECEIPT_1.pdf"))
+
+    assert os.path.basename(first) == "RECEIPT_1.pdf"
+    assert os.path.basename(second) == "RECEIPT_1 1.pdf"
+
+
+def test_folder_reject_without_root_renames_in_place(tmp_path):
+    directory = str(tmp_path)
+    location = FolderOutput().reject(directory, "RECEIPT_1.pdf", download(directory, "RECEIPT_1.pdf"))
+
+    assert location == str(tmp_path / "RECEIPT_1.pdf.invalid")
+    assert os.listdir(directory) == ["RECEIPT_1.pdf.invalid"]
+
+
+@pytest.fixture(params=["zip", "tar"])
+def archive_output(request, tmp_path):
+    output = ArchiveOutput(str(tmp_path / "root"), kind=request.param)
+    yield output
+    output.close()
+
+
+def period_directory(output):
+    return os.path.join(output.root, "Company", "YEAR 2024", "3.MAR-2024")
+
+
+def stage(output, directory, filename, content=b"%PDF-1.4 valid"):
+    assert output.reserve(directory, filename)
+    return download(output.staging_directory(directory), filename, content)
+
+
+def archive_names(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            return zf.namelist()
+    with tarfile.open(path) as tf:
+        return tf.getnames()
+
+
+def test_create_output_kinds(tmp_path):
+    assert isinstance(create_output("folder", str(tmp_path)), FolderOutput)
+    output = create_output("tar", str(tmp_path))
+    assert isinstance(output, ArchiveOutput) and output.kind == "tar"
+    output.close()
+    with pytest.raises(ValueError):
+        create_output("rar", str(tmp_path))
+
+
+def test_archive_commit_appends_and_records_manifest(archive_output):
+    directory = period_directory(archive_output)
+    staged_path = stage(archive_output, directory, "RECEIPT_1.pdf")
+
+    location = archive_output.commit(directory, "RECEIPT_1.pdf", staged_path, metadata={'username': "user"})
+
+    archive_path = f"{directory}.{archive_output.kind}"
+    assert location == f"{archive_path}::RECEIPT_1.pdf"
+    assert archive_names(archive_path) == ["RECEIPT_1.pdf"]
+    assert read_stored_file(location) == b"%PDF-1.4 valid"
+    assert not os.path.exists(staged_path)
+
+    with open(os.path.join(archive_output.root, MANIFEST_FILENAME), encoding='utf-8') as f:
+        entry = json.loads(f.read())
+    assert entry['archive'] == os.path.join("Company", "YEAR 2024", f"3.MAR-2024.{archive_output.kind}")
+    assert entry['member'] == "RECEIPT_1.pdf" and entry['username'] == "user" and entry['size'] == 14
+
+
+def test_archive_reserve_sees_archived_and_staged_names(archive_output):
+    directory = period_directory(archive_output)
+    staged_path = stage(archive_output, directory, "RECEIPT_1.pdf")
+    assert not archive_output.reserve(directory, "RECEIPT_1.pdf")
+
+    archive_output.commit(directory, "RECEIPT_1.pdf", staged_path)
+    assert archive_output.exists(directory, "RECEIPT_1.pdf")
+    assert not archive_output.reserve(directory, "RECEIPT_1.pdf")
+
+    assert archive_output.reserve(directory, "RECEIPT_2.pdf")
+    archive_output.release(directory, "RECEIPT_2.pdf")
+    assert not archive_output.exists(directory, "RECEIPT_2.pdf")
+
+
+def test_archive_commit_renames_member_added_by_another_host(archive_output, tmp_path):
+    directory = period_directory(archive_output)
+    other_host = ArchiveOutput(archive_output.root, kind=archive_output.kind, staging_root=str(tmp_path / "other"))
+    staged_path = stage(other_host, directory, "RECEIPT_1.pdf")
+    other_host.commit(directory, "RECEIPT_1.pdf", staged_path)
+
+    # Reserved before the other host's commit reached the manifest this host loaded
+    staged_path = stage(archive_output, directory, "RECEIPT_1.pdf")
+    location = archive_output.commit(directory, "RECEIPT_1.pdf", staged_path)
+
+    assert location.endswith("::RECEIPT_1 1.pdf")
+    # A restarted host finds both members through the manifest
+    restarted = ArchiveOutput(archive_output.root, kind=archive_output.kind, staging_root=str(tmp_path / "restarted"))
+    assert restarted.exists(directory, "RECEIPT_1.pdf") and restarted.exists(directory, "RECEIPT_1 1.pdf")
+
+
+def test_archive_reject_moves_file_to_rejected_folder(archive_output):
+    directory = period_directory(archive_output)
+    staged_path = stage(archive_output, directory, "RECEIPT_1.pdf", b"broken")
+
+    path = archive_output.reject(directory, "RECEIPT_1.pdf", staged_path)
+
+    assert path == os.path.join(archive_output.root, REJECTED_DIRECTORY, "Company", "YEAR 2024", "3.MAR-2024", "RECEIPT_1.pdf")
+    assert not os.path.exists(staged_path)
+    assert not os.path.exists(f"{directory}.{archive_output.kind}")
+
+
+def test_archive_close_rejects_unarchived_files_and_removes_staging(archive_output):
+    directory = period_directory(archive_output)
+    stage(archive_output, directory, "RECEIPT_1.pdf")
+    # An empty placeholder is a reserved name that never got content
+    assert archive_output.reserve(directory, "RECEIPT_2.pdf")
+
+    archive_output.close()
+
+    rejected_directory = os.path.join(archive_output.root, REJECTED_DIRECTORY, "Company", "YEAR 2024", "3.MAR-2024")
+    assert os.listdir(rejected_directory) == ["RECEIPT_1.pdf"]
+    assert not os.path.exists(archive_output.staging_root)
+
+
+def test_unique_member_name():
+    assert unique_member_name([], "a.pdf") == "a.pdf"
+    assert unique_member_name(["a.pdf", "a 1.pdf"], "a.pdf") == "a 2.pdf"
+
+
+def test_file_lock_removes_stale_lock(tmp_path):
+    path = str(tmp_path / "archive.zip")
+    download(str(tmp_path), "archive.zip.lock", b"")
+    os.utime(f"{path}.lock", (0, 0))
+
+    with file_lock(path, timeout=1):
+        assert os.path.exists(f"{path}.lock")
+    assert not os.path.exists(f"{path}.lock")
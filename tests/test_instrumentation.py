@@ -0,0 +1,65 @@
+import json
+
+from instrumentation import DriverMetrics, job_phase, notify_driver_started
+
+
+class FakeDriver:
+    """Driver stand-in with the execute method every WebDriver command goes through."""
+
+    def execute(self, command, params=None):
+        return {'value': command}
+
+
+def command_counts(metrics):
+    return metrics.summary()['by_command']
+
+
+def test_records_commands_by_phase():
+    driver = FakeDriver()
+    metrics = DriverMetrics("job")
+    notify_driver_started([metrics], driver)
+    with job_phase([metrics], "login"):
+        driver.execute("get")
+    with job_phase([metrics], "download"):
+        driver.execute("findElements")
+        driver.execute("clickElement")
+
+    summary = metrics.summary()
+    assert summary['commands'] == 3
+    assert {group: totals['count'] for group, totals in summary['by_phase']['download'].items()} == {'find': 1, 'click': 1}
+    assert set(summary['phase_seconds']) == {"login", "download"}
+
+
+def test_jobs_sharing_a_driver_get_their_own_commands():
+    driver = FakeDriver()
+    session = DriverMetrics("user (2 tabs)")
+    first = DriverMetrics("user MAR-2024", session=session)
+    second = DriverMetrics("user APR-2024", session=session)
+    notify_driver_started([session, first, second], driver)
+
+    with job_phase([session], "login"):
+        driver.execute("get")
+    with job_phase([first], "download"):
+        driver.execute("clickElement")
+    driver.execute("switchToWindow")
+    with job_phase([second], "download"):
+        driver.execute("findElements")
+        driver.execute("findElements")
+    with job_phase([first], "next_page"):
+        driver.execute("clickElement")
+
+    # Instrumented once, every command is counted exactly once
+    assert command_counts(session) == {'get': 1, 'switchToWindow': 1}
+    assert command_counts(first) == {'clickElement': 2}
+    assert command_counts(second) == {'findElements': 2}
+    assert set(first.summary()['by_phase']) == {"download", "next_page"}
+
+
+def test_write_appends_one_line_per_report(tmp_path):
+    path = str(tmp_path / "metrics" / "webdriver_metrics.jsonl")
+    DriverMetrics("first").write(path, {'tab': 0})
+    DriverMetrics("second").write(path, {'tab': 1})
+
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [(record['label'], record['tab']) for record in records] == [("first", 0), ("second", 1)]
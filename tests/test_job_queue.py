@@ -0,0 +1,178 @@
+import time
+
+import pytest
+
+from job_queue import InMemoryJobQueue, LeaseKeeper, LeaseLost, SQLiteJobQueue, job_key
+
+
+def make_job(username="acme", month="ม.ค."):
+    return {
+        'username': username,
+        'company_name': f"{username} co",
+        'filter_form': [
+            {'form': 'taxForm', 'item': 'ภ.พ.30', 'type': 'dropdown'},
+            {'form': 'taxYear', 'item': '2567', 'type': 'dropdown'},
+            {'form': 'taxMonth', 'item': month, 'type': 'dropdown'},
+        ],
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_queue(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return InMemoryJobQueue(**kwargs)
+        return SQLiteJobQueue(str(tmp_path / "jobs.sqlite"), **kwargs)
+    return make
+
+
+def test_put_ignores_duplicates_of_the_same_run(make_queue):
+    queue = make_queue()
+    assert queue.put(make_job(), run_id="run-1")
+    assert not queue.put(make_job(), run_id="run-1")
+    assert queue.put(make_job(month="ก.พ."), run_id="run-1")
+    assert queue.counts()['pending'] == 2
+
+
+def test_new_run_queues_done_and_failed_jobs_again(make_queue):
+    queue = make_queue(max_attempts=1)
+    queue.put(make_job(), run_id="run-1")
+    queue.put(make_job(month="ก.พ."), run_id="run-1")
+    done = queue.claim("worker")
+    queue.complete(done['job_id'], "worker")
+    failed = queue.claim("worker")
+    queue.fail(failed['job_id'], "worker", "boom")
+    assert queue.counts() == {'pending': 0, 'running': 0, 'done': 1, 'failed': 1}
+
+    assert not queue.put(make_job(), run_id="run-1")
+    assert queue.put(make_job(), run_id="run-2")
+    assert queue.put(make_job(month="ก.พ."), run_id="run-2")
+    assert queue.counts() == {'pending': 2, 'running': 0, 'done': 0, 'failed': 0}
+    # Attempts start again for the new run
+    assert queue.claim("worker")['attempt'] == 1
+
+
+def test_put_without_run_id_joins_the_current_run(make_queue):
+    queue = make_queue()
+    queue.put(make_job(), run_id="run-1")
+    job = queue.claim("worker")
+    queue.complete(job['job_id'], "worker")
+    assert not queue.put(make_job())
+    assert queue.counts()['done'] == 1
+
+
+def test_new_run_leaves_pending_and_running_jobs_alone(make_queue):
+    queue = make_queue()
+    queue.put(make_job(), run_id="run-1")
+    queue.put(make_job(month="ก.พ."), run_id="run-1")
+    running = queue.claim("worker")
+    assert not queue.put(make_job(), run_id="run-2")
+    assert not queue.put(make_job(month="ก.พ."), run_id="run-2")
+    assert queue.heartbeat(running['job_id'], "worker")
+
+
+def test_claim_leases_jobs_in_order(make_queue):
+    queue = make_queue()
+    queue.put(make_job(month="ม.ค."))
+    queue.put(make_job(month="ก.พ."))
+    first = queue.claim("worker-1")
+    second = queue.claim("worker-2")
+    assert first['job_id'] == job_key(make_job(month="ม.ค."))
+    assert second['job_id'] == job_key(make_job(month="ก.พ."))
+    assert first['attempt'] == 1
+    assert queue.claim("worker-3") is None
+    assert queue.counts()['running'] == 2
+
+
+def test_claim_by_username(make_queue):
+    queue = make_queue()
+    queue.put(make_job(username="acme"))
+    queue.put(make_job(username="acme2"))
+    job = queue.claim("worker", username="acme2")
+    assert job['username'] == "acme2"
+    # A username that only shares a prefix with another is not matched
+    assert queue.claim("worker", username="acm") is None
+    assert queue.claim("worker", username="acme")['username'] == "acme"
+
+
+def test_only_the_owner_renews_or_completes_a_job(make_queue):
+    queue = make_queue()
+    queue.put(make_job())
+    job = queue.claim("worker-1")
+    assert queue.heartbeat(job['job_id'], "worker-1")
+    assert not queue.heartbeat(job['job_id'], "worker-2")
+    queue.complete(job['job_id'], "worker-2")
+    assert queue.counts()['running'] == 1
+    queue.complete(job['job_id'], "worker-1")
+    assert queue.counts()['done'] == 1
+    assert not queue.heartbeat(job['job_id'], "worker-1")
+
+
+def test_failed_job_is_retried_until_attempts_run_out(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.put(make_job())
+    job = queue.claim("worker")
+    queue.fail(job['job_id'], "worker", "boom")
+    assert queue.counts()['pending'] == 1
+    job = queue.claim("worker")
+    assert job['attempt'] == 2
+    queue.fail(job['job_id'], "worker", "boom")
+    assert queue.counts() == {'pending': 0, 'running': 0, 'done': 0, 'failed': 1}
+
+
+def test_expired_lease_is_requeued(make_queue):
+    queue = make_queue(lease_seconds=0.05)
+    queue.put(make_job())
+    job = queue.claim("worker-1")
+    time.sleep(0.1)
+    assert queue.requeue_expired() == 1
+    assert queue.counts()['pending'] == 1
+    # The dead worker no longer owns the job once another worker claims it
+    assert queue.claim("worker-2")['attempt'] == 2
+    assert not queue.heartbeat(job['job_id'], "worker-1")
+    queue.complete(job['job_id'], "worker-1")
+    assert queue.counts()['running'] == 1
+
+
+def test_expired_lease_counts_as_an_attempt(make_queue):
+    queue = make_queue(lease_seconds=0.05, max_attempts=1)
+    queue.put(make_job())
+    queue.claim("worker")
+    time.sleep(0.1)
+    assert queue.claim("worker") is None
+    assert queue.counts()['failed'] == 1
+
+
+def test_lease_keeper_renews_the_lease(make_queue):
+    queue = make_queue(lease_seconds=0.3)
+    queue.put(make_job())
+    job = queue.claim("worker")
+    with LeaseKeeper(queue, job['job_id'], "worker", interval=0.05) as lease:
+        time.sleep(0.5)
+        assert queue.requeue_expired() == 0
+    assert not lease.lost
+    lease.raise_if_lost()
+
+
+def test_lease_keeper_reports_a_lost_lease(make_queue):
+    queue = make_queue()
+    queue.put(make_job())
+    job = queue.claim("worker-1")
+    lost = []
+    with LeaseKeeper(queue, job['job_id'], "worker-1", interval=0.05, on_lost=lambda: lost.append(True)) as lease:
+        queue.fail(job['job_id'], "worker-1", "taken over")
+        queue.claim("worker-2")
+        time.sleep(0.2)
+    assert lease.lost
+    assert lost == [True]
+    with pytest.raises(LeaseLost):
+        lease.raise_if_lost()
+
+
+def test_sqlite_queue_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    SQLiteJobQueue(path).put(make_job(), run_id="run-1")
+    assert not SQLiteJobQueue(path).put(make_job(), run_id="run-1")
+    job = SQLiteJobQueue(path).claim("worker")
+    assert job['job_id'] == job_key(make_job())
+    assert SQLiteJobQueue(path).counts()['running'] == 1
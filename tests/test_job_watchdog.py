@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from job_watchdog import forget_browsers, pid_alive, reap_orphaned_browsers, register_browser, registry_path
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="browser cleanup is POSIX only")
+
+
+@pytest.fixture
+def start_chromedriver(tmp_path):
+    """Start a long sleep named chromedriver, so it looks like an automation browser."""
+    executable = tmp_path / "chromedriver"
+    shutil.copy(shutil.which("sleep"), executable)
+    started = []
+
+    def start():
+        process = subprocess.Popen([str(executable), "60"])
+        started.append(process)
+        return process
+
+    yield start
+    for process in started:
+        process.kill()
+        process.wait()
+
+
+def fake_driver(process):
+    return SimpleNamespace(service=SimpleNamespace(process=process))
+
+
+def exited_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def move_registry(registry, owner):
+    """Hand this process's registry file to another worker pid."""
+    os.replace(registry_path(registry), registry_path(registry, pid=owner))
+
+
+def test_register_and_forget(tmp_path, start_chromedriver):
+    registry = str(tmp_path / "registry")
+    process = start_chromedriver()
+    assert register_browser(fake_driver(process), registry=registry) == [process.pid]
+    assert os.path.exists(registry_path(registry))
+
+    forget_browsers([process.pid], registry=registry)
+    assert not os.path.exists(registry_path(registry))
+
+
+def test_reaps_browsers_of_exited_workers(tmp_path, start_chromedriver):
+    registry = str(tmp_path / "registry")
+    process = start_chromedriver()
+    register_browser(fake_driver(process), registry=registry)
+    move_registry(registry, exited_pid())
+
+    assert reap_orphaned_browsers(registry=registry) == [process.pid]
+    process.wait(timeout=5)
+    assert os.listdir(registry) == []
+
+
+def test_keeps_browsers_of_running_workers(tmp_path, start_chromedriver):
+    registry = str(tmp_path / "registry")
+    worker = start_chromedriver()
+    process = start_chromedriver()
+    register_browser(fake_driver(process), registry=registry)
+    move_registry(registry, worker.pid)
+
+    assert reap_orphaned_browsers(registry=registry) == []
+    assert pid_alive(process.pid)
+
+
+def test_skips_untracked_and_reused_pids(tmp_path, start_chromedriver):
+    registry = str(tmp_path / "registry")
+    # Started outside any worker, for example by a developer
+    untracked = start_chromedriver()
+    os.makedirs(registry)
+    process = start_chromedriver()
+    with open(registry_path(registry, pid=exited_pid()), "w") as f:
+        # Same pid, but recorded with the start time of an earlier process
+        f.write(f"{process.pid} 1\n")
+
+    assert reap_orphaned_browsers(registry=registry) == []
+    assert pid_alive(untracked.pid) and pid_alive(process.pid)
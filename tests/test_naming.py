@@ -0,0 +1,149 @@
+import os
+import random
+
+import pytest
+
+import naming
+
+THAI_FORMS = tuple(naming.THAI_TO_ENG_TAX_FORM) + ("แบบอื่น", "", None)
+THAI_MONTHS = tuple(naming.THAI_TO_ENG_MONTH)
+KINDS = ("RECEIPT", "TAX_FORM", "C02")
+SYSTEM_CODES = tuple(naming.SYSTEM_TO_ENG_TAX_FORM) + ("P5", "X", "")
+
+
+def previous_split_tax_form(tax_form, url_extr):
+    """split_tax_form as it was in EFillingController.py before naming.py existed."""
+    try:
+        tax_name_index = url_extr.index(tax_form) + len(tax_form)
+    except ValueError:
+        return "UNKNOWN"
+    return naming.convert_system_tax_form_to_eng(url_extr[tax_name_index:tax_name_index + 3])
+
+
+def previous_base_file_name(url, filter_form, username, max_button, button_counter):
+    """The base name get_file_name built before naming.py existed, without its logging."""
+    tax_name = naming.convert_thai_tax_form_to_eng(filter_form[0]['item'])
+    tax_year = naming.convert_thai_year_to_eng(filter_form[1]['item'])
+    tax_month = naming.convert_thai_month_to_eng(filter_form[2]['item']).upper()
+    url_extr = url.split('/')[-1]
+
+    if "RECEIPT" in url_extr:
+        tax_name = previous_split_tax_form("RECEIPT_", url_extr)
+        if max_button > 3 and button_counter == 2:
+            return f"RECEIPT_POR.2 - PENALTY FEE {tax_name} {tax_month}-{tax_year} {username}.pdf"
+        return f"RECEIPT_{tax_name} {tax_month}-{tax_year} {username}.pdf"
+    if "TAX_FORM" in url_extr:
+        tax_name = previous_split_tax_form("TAX_FORM_", url_extr)
+        return f"{tax_name} {tax_month}-{tax_year} {username}.pdf"
+    if "C02" in url_extr:
+        tax_name = previous_split_tax_form("C02_", url_extr)
+        return f"POR.2 - PENALTY FEE {tax_name} {tax_month}-{tax_year} {username}.pdf"
+    return f"UNKNOWN_{tax_name} {tax_month}-{tax_year} {username}.pdf"
+
+
+def previous_target_path(url, filter_form, button_index, max_buttons, company_name, download_directory, taken):
+    """Directory and numbering of the previous get_file_name, with taken standing in for os.path.exists."""
+    tax_year = naming.convert_thai_year_to_eng(filter_form[1]['item'])
+    tax_month = naming.convert_thai_month_to_eng(filter_form[2]['item'])
+    destination = "/".join([company_name, f"YEAR {tax_year}", f"{naming.get_month_index(tax_month)}.{tax_month}-{tax_year}"])
+    directory = os.path.join(download_directory, destination)
+
+    base_filename = previous_base_file_name(url, filter_form, company_name, max_buttons, button_index)
+    filename = base_filename
+    index = 1
+    while (directory, filename) in taken:
+        filename = f"{base_filename[:-4]} {index}.pdf"
+        index += 1
+    taken.add((directory, filename))
+    return os.path.join(directory, filename)
+
+
+def random_url(rng):
+    """Download URL with zero to three document tokens, some without a form code or separator."""
+    parts = []
+    for _ in range(rng.randint(0, 3)):
+        token = rng.choice(KINDS)
+        roll = rng.random()
+        if roll < 0.7:
+            token += "_" + rng.choice(SYSTEM_CODES) + rng.choice(("", "1", "A", "_2567"))
+        elif roll < 0.85:
+            token += "_"
+        parts.append(token)
+        parts.append(rng.choice(("", "_", "-ref", "_2567-000123")))
+    name = "".join(parts) or rng.choice(("file", "download", "PDF_2567"))
+    prefix = rng.choice(KINDS).lower()
+    return f"https://efiling.rd.go.th/rd-cit-edge-printform-service/common/download/{prefix}/{name}.pdf/{name}.pdf"
+
+
+def random_filter_form(rng):
+    return [
+        {'form': 'taxForm', 'item': rng.choice(THAI_FORMS), 'type': 'dropdown'},
+        {'form': 'taxYear', 'item': rng.choice(("2566", "2567", "2568")), 'type': 'dropdown'},
+        {'form': 'taxMonth', 'item': rng.choice(THAI_MONTHS), 'type': 'dropdown'},
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_base_file_name_matches_previous_implementation(seed):
+    rng = random.Random(seed)
+    for _ in range(10000):
+        url = random_url(rng)
+        filter_form = random_filter_form(rng)
+        max_button = rng.randint(1, 5)
+        button_counter = rng.randrange(max_button)
+        expected = previous_base_file_name(url, filter_form, "ACME CO", max_button, button_counter)
+        names = naming.filter_names(filter_form)
+        assert naming.base_file_name(url, names, "ACME CO", max_button, button_counter) == expected, url
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_target_paths_matches_previous_numbering(seed):
+    rng = random.Random(seed)
+    # Few companies, periods and URLs, so names repeat and get numbered
+    urls = [random_url(rng) for _ in range(40)]
+    filter_forms = [random_filter_form(rng) for _ in range(4)]
+    records = []
+    for _ in range(3000):
+        max_buttons = rng.randint(1, 5)
+        records.append(naming.NameRecord(rng.choice(urls), rng.choice(filter_forms), rng.randrange(max_buttons), max_buttons, f"Company {rng.randrange(3)}"))
+
+    existing = set()
+    for record in records[:50]:
+        directory = os.path.dirname(previous_target_path(*record, "/downloads", set()))
+        existing.add((directory, naming.base_file_name(record.url, naming.filter_names(record.filter_form), record.company_name, record.max_buttons, record.button_index)))
+
+    taken = set(existing)
+    expected = [previous_target_path(*record, "/downloads", taken) for record in records]
+    actual = naming.target_paths(records, "/downloads", taken=lambda directory, filename: (directory, filename) in existing)
+    assert actual == expected
+
+
+def test_parse_download_url_reads_kind_and_form():
+    assert naming.parse_download_url("https://host/x/RECEIPT_P30123_2567.pdf") == ("RECEIPT", "PP30")
+    assert naming.parse_download_url("https://host/x/TAX_FORM_P53_2567.pdf") == ("TAX_FORM", "PND53")
+    assert naming.parse_download_url("https://host/x/C02_P03_2567.pdf") == ("C02", "PND3")
+    # Receipts win over the other kinds, as in the previous if/elif chain
+    assert naming.parse_download_url("https://host/x/TAX_FORM_P53_RECEIPT_P30.pdf") == ("RECEIPT", "PP30")
+    assert naming.parse_download_url("https://host/x/RECEIPT.pdf") == ("RECEIPT", "UNKNOWN")
+    assert naming.parse_download_url("https://host/RECEIPT_P30/file.pdf") == ("UNKNOWN", None)
+
+
+def test_form_codes_are_read_as_three_characters():
+    # File names must not change for existing folders, so P53A is still named PND53
+    assert naming.parse_download_url("https://host/x/TAX_FORM_P53A_2567.pdf") == ("TAX_FORM", "PND53")
+    assert naming.parse_download_url("https://host/x/TAX_FORM_Q99_2567.pdf") == ("TAX_FORM", "TAX_FORM")
+
+
+def test_penalty_documents():
+    assert naming.classify_download("https://host/x/C02_P30.pdf", 2, 1) == ("C02", "PP30", True)
+    assert naming.classify_download("https://host/x/RECEIPT_P30.pdf", 4, 2) == ("RECEIPT", "PP30", True)
+    assert naming.classify_download("https://host/x/RECEIPT_P30.pdf", 3, 2) == ("RECEIPT", "PP30", False)
+
+
+def test_construct_download_directory():
+    assert naming.construct_download_directory("/downloads", "ACME CO", "2024", "MAR") == os.path.join("/downloads", "ACME CO/YEAR 2024/3.MAR-2024")
+
+
+def test_tables_are_read_only():
+    with pytest.raises(TypeError):
+        naming.THAI_TO_ENG_MONTH["ม.ค."] = "X"
@@ -0,0 +1,167 @@
+import csv
+import os
+import zlib
+
+import pytest
+
+from pdf_extraction import FIELDS, PROCESSED_FILENAME, PdfExtractionQueue, extract_fields, extract_text_stdlib, parse_fields, parse_period
+
+PP30_TEXT = """แบบแสดงรายการภาษีมูลค่าเพิ่ม ภ.พ.30
+เลขประจำตัวผู้เสียภาษีอากร 0-1055-51234-56-7
+สำหรับเดือนภาษี มีนาคม พ.ศ. 2567
+ภาษีขาย 12,500.00
+ภาษีซื้อ 9,000.00
+ภาษีสุทธิที่ต้องชำระ 3,500.00
+เงินเพิ่ม 52.50
+"""
+
+PND3_TEXT = """แบบยื่นรายการภาษีเงินได้หัก ณ ที่จ่าย ภ.ง.ด.3
+เลขประจำตัวผู้เสียภาษีอากร 1234567890123
+เดือนที่จ่ายเงินได้ 02/2567
+ยอดเงินได้ทั้งสิ้น 100,000.00
+รวมยอดภาษีที่นำส่ง 3,000.00
+"""
+
+PND53_RECEIPT_TEXT = """ใบเสร็จรับเงิน ภ.ง.ด.53
+เลขที่ใบเสร็จรับเงิน : P53-2024/000123
+เลขประจำตัวผู้เสียภาษีอากร 0 1055 51234 56 7
+Tax Month 12/2023
+ภาษีที่นำส่ง 1,234.56
+"""
+
+
+def utf16_hex(text):
+    return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode() + b">"
+
+
+def make_pdf(lines, compress=True):
+    """Minimal PDF with one content stream showing each line as Thai UTF-16 text."""
+    content = b"BT /F1 12 Tf\n" + b"".join(utf16_hex(line) + b" Tj T*\n" for line in lines) + b"ET"
+    if compress:
+        content = zlib.compress(content)
+    dictionary = b"<< /Length %d%s >>" % (len(content), b" /Filter /FlateDecode" if compress else b"")
+    return (b"%PDF-1.4\n1 0 obj << /Type /Page /Contents 2 0 R >> endobj\n2 0 obj " + dictionary
+            + b"\nstream\n" + content + b"\nendstream\nendobj\n%%EOF\n")
+
+
+@pytest.mark.parametrize("text, period", [
+    ("เดือนภาษี มีนาคม พ.ศ. 2567", "2024-03"),
+    ("ธันวาคม 2023", "2023-12"),
+    ("งวด 02/2567", "2024-02"),
+    ("Tax Month 1/2024", "2024-01"),
+    ("วันที่ 15/03/2567", None),
+    ("13/2567", None),
+    ("no period", None),
+])
+def test_parse_period(text, period):
+    assert parse_period(text) == period
+
+
+def test_parse_pp30():
+    fields = parse_fields(PP30_TEXT, "PP30")
+    assert fields == {'tax_id': "0105551234567", 'period': "2024-03", 'tax_amount': 3500.0, 'surcharge': 52.5, 'receipt_number': None}
+
+
+def test_parse_pnd3():
+    fields = parse_fields(PND3_TEXT, "PND3")
+    assert fields['tax_id'] == "1234567890123"
+    assert fields['period'] == "2024-02"
+    # The total paid, not the income it was withheld from
+    assert fields['tax_amount'] == 3000.0
+    assert fields['surcharge'] is None
+
+
+def test_parse_pnd53_receipt():
+    fields = parse_fields(PND53_RECEIPT_TEXT, "PND53")
+    assert fields == {'tax_id': "0105551234567", 'period': "2023-12", 'tax_amount': 1234.56, 'surcharge': None, 'receipt_number': "P53-2024/000123"}
+
+
+def test_unknown_form_uses_default_labels():
+    assert parse_fields("Tax Amount: 1,000.00", "PP36")['tax_amount'] == 1000.0
+    assert parse_fields("", None) == dict.fromkeys(FIELDS)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_stdlib_extraction_of_thai_text(compress):
+    text = extract_text_stdlib(make_pdf(PP30_TEXT.splitlines(), compress=compress))
+    assert text.splitlines() == PP30_TEXT.splitlines()
+    assert parse_fields(text, "PP30")['tax_amount'] == 3500.0
+
+
+def test_stdlib_extraction_of_literal_strings():
+    content = b"BT (Receipt No. R-1) Tj [(Tax ) -20 (Amount 1,000.00)] TJ (line\\)\\n) ' ET"
+    data = b"%PDF-1.4\nstream\n" + content + b"\nendstream\n%%EOF\n"
+    assert extract_text_stdlib(data).splitlines() == ["Receipt No. R-1", "Tax Amount 1,000.00", "line)"]
+
+
+def test_extract_fields_reports_errors(tmp_path):
+    fields = extract_fields(str(tmp_path / "missing.pdf"))
+    assert fields['error'].startswith("FileNotFoundError")
+    assert fields['tax_amount'] is None
+
+
+def read_records(directory):
+    records = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".csv"):
+            with open(os.path.join(directory, name), newline="", encoding="utf-8") as f:
+                records.extend(csv.DictReader(f))
+    return records
+
+
+def test_queue_writes_batches_and_lists_only_extracted_files(tmp_path):
+    stored = tmp_path / "stored"
+    stored.mkdir()
+    valid = stored / "PP30.pdf"
+    valid.write_bytes(make_pdf(PP30_TEXT.splitlines()))
+    missing = str(stored / "missing.pdf")
+    output = str(tmp_path / "extracted")
+
+    with PdfExtractionQueue(output, max_workers=1, batch_size=1) as extractor:
+        assert extractor.submit(str(valid), {'form_code': "PP30", 'company_name': "ACME CO"})
+        assert extractor.submit(missing)
+        extractor.join()
+        assert not extractor.submit(str(valid))
+
+    records = {record['location']: record for record in read_records(output)}
+    assert records[str(valid)]['tax_amount'] == "3500.0" and records[str(valid)]['company_name'] == "ACME CO"
+    assert records[missing]['error']
+    with open(os.path.join(output, PROCESSED_FILENAME), encoding="utf-8") as f:
+        assert f.read().splitlines() == [str(valid)]
+
+    # A later run skips processed files and tries the failed one again
+    with PdfExtractionQueue(output, max_workers=1) as extractor:
+        assert not extractor.submit(str(valid))
+        assert extractor.submit(missing)
+
+
+def test_queue_buffers_until_batch_is_full(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(make_pdf(["ภาษีที่นำส่ง 10.00"]))
+    output = str(tmp_path / "extracted")
+
+    extractor = PdfExtractionQueue(output, max_workers=1, batch_size=10)
+    try:
+        extractor.submit(str(path))
+        extractor.join()
+        assert read_records(output) == []
+        assert not os.path.exists(os.path.join(output, PROCESSED_FILENAME))
+    finally:
+        extractor.close()
+    assert [record['tax_amount'] for record in read_records(output)] == ["10.0"]
+
+
+def test_extract_fields_from_archive(tmp_path):
+    from download_output import ArchiveOutput
+
+    output = ArchiveOutput(str(tmp_path), kind="zip", staging_root=str(tmp_path / "staging"))
+    directory = str(tmp_path / "ACME CO" / "YEAR 2024" / "3.MAR-2024")
+    staged_path = os.path.join(output.staging_directory(directory), "PP30.pdf")
+    output.reserve(directory, "PP30.pdf")
+    with open(staged_path, "wb") as f:
+        f.write(make_pdf(PP30_TEXT.splitlines()))
+    location = output.commit(directory, "PP30.pdf", staged_path)
+
+    fields = extract_fields(location, "PP30")
+    assert fields['error'] is None and fields['extractor'] == "stdlib"
+    assert fields['period'] == "2024-03" and fields['tax_amount'] == 3500.0
@@ -0,0 +1,112 @@
+import json
+import threading
+
+import pytest
+
+from pdf_validation import PdfValidationQueue, validate_pdf
+
+
+def make_pdf(pages=1, padding=2048):
+    body = b"".join(b"%d 0 obj << /Type /Page >> endobj\n" % (index + 2) for index in range(pages))
+    return b"%PDF-1.4\n1 0 obj << /Type /Pages >> endobj\n" + body + b"%" + b"x" * padding + b"\n%%EOF\n"
+
+
+def write(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with PdfValidationQueue(report_path=str(tmp_path / "report.jsonl"), max_workers=1) as queue:
+        yield queue
+
+
+def test_valid_pdf_counts_pages(tmp_path):
+    result = validate_pdf(write(tmp_path / "a.pdf", make_pdf(pages=3)))
+    assert result['valid']
+    assert result['pages'] == 3
+    assert result['reason'] is None
+
+
+@pytest.mark.parametrize("content, reason", [
+    (b"<html><body>Session expired</body></html>", "html page instead of pdf"),
+    (b"garbage", "missing %PDF header"),
+    (make_pdf()[:-7], "missing %%EOF marker, file truncated"),
+    (b"%PDF-1.4\n" + b"%" + b"x" * 2048 + b"\n%%EOF\n", "no pages found"),
+    (make_pdf(padding=10), "file smaller than 1024 bytes"),
+])
+def test_invalid_pdfs(tmp_path, content, reason):
+    result = validate_pdf(write(tmp_path / "a.pdf", content))
+    assert not result['valid']
+    assert result['reason'] == reason
+
+
+def test_missing_file_is_unreadable(tmp_path):
+    result = validate_pdf(str(tmp_path / "missing.pdf"))
+    assert not result['valid']
+    assert result['reason'].startswith("unreadable")
+
+
+def test_object_streams_leave_page_count_unknown(tmp_path):
+    content = b"%PDF-1.5\n1 0 obj << /Type /ObjStm >> endobj\n%" + b"x" * 2048 + b"\n%%EOF\n"
+    result = validate_pdf(write(tmp_path / "a.pdf", content))
+    assert result['valid']
+    assert result['pages'] is None
+
+
+def test_queue_hands_valid_files_to_on_valid(tmp_path, queue):
+    path = write(tmp_path / "a.pdf", make_pdf())
+    stored, rejected = [], []
+    queue.submit(None, path, metadata={'username': "user"}, on_valid=stored.append, on_invalid=rejected.append)
+    queue.join()
+
+    assert [result['path'] for result in stored] == [path]
+    assert rejected == []
+    record = json.loads((tmp_path / "report.jsonl").read_text(encoding='utf-8'))
+    assert record['valid'] and record['username'] == "user" and record['repairs'] == 0
+
+
+def test_queue_repairs_broken_file_from_url(tmp_path, queue):
+    source = write(tmp_path / "source.pdf", make_pdf())
+    path = write(tmp_path / "a.pdf", b"<html>error</html>")
+    stored, rejected = [], []
+    queue.submit((tmp_path / "source.pdf").as_uri(), path, on_valid=stored.append, on_invalid=rejected.append)
+    queue.join()
+
+    assert len(stored) == 1 and rejected == []
+    assert queue.results[0]['repairs'] == 1
+    with open(path, 'rb') as f, open(source, 'rb') as g:
+        assert f.read() == g.read()
+
+
+def test_queue_gives_up_after_max_repairs(tmp_path):
+    write(tmp_path / "source.pdf", b"<html>still broken</html>")
+    path = write(tmp_path / "a.pdf", b"<html>error</html>")
+    stored, rejected = [], []
+    with PdfValidationQueue(max_workers=1, max_repairs=2) as queue:
+        queue.submit((tmp_path / "source.pdf").as_uri(), path, on_valid=stored.append, on_invalid=rejected.append)
+
+    assert stored == []
+    assert [result['reason'] for result in rejected] == ["html page instead of pdf"]
+    assert queue.results[0]['repairs'] == 2
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_failing_callback_still_finishes(tmp_path, queue):
+    def on_valid(result):
+        raise OSError("disk full")
+
+    queue.submit(None, write(tmp_path / "a.pdf", make_pdf()), on_valid=on_valid)
+    queue.join()
+    assert len(queue.results) == 1
+
+
+def test_slow_store_does_not_hold_up_other_results(tmp_path, queue):
+    release = threading.Event()
+    stored = []
+    queue.submit(None, write(tmp_path / "slow.pdf", make_pdf()), on_valid=lambda result: release.wait(10))
+    queue.submit(None, write(tmp_path / "fast.pdf", make_pdf()), on_valid=lambda result: (stored.append(result), release.set()))
+    queue.join()
+
+    assert [result['path'] for result in stored] == [str(tmp_path / "fast.pdf")]
@@ -0,0 +1,115 @@
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Constants
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+CELL_REF_PATTERN = re.compile(r"([A-Z]+)(\d+)")
+
+
+def column_index(letters):
+    """Convert a column name such as 'A' or 'AB' into a zero-based index."""
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+
+def number_text(value):
+    """Format a numeric cell the way pandas does when reading with dtype=str."""
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    if number.is_integer() and ('.' in value or 'E' in value.upper()):
+        return str(int(number))
+    return value
+
+
+def read_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    root = ET.fromstring(archive.read("xl/sharedStrings.xml"))
+    # Rich text entries are split into several <t> runs
+    return ["".join(t.text or "" for t in si.iter(f"{MAIN_NS}t")) for si in root.iter(f"{MAIN_NS}si")]
+
+
+def sheet_path(archive, sheet_index):
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheet = workbook.find(f"{MAIN_NS}sheets")[sheet_index]
+    rel_id = sheet.get(f"{REL_NS}id")
+
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise ValueError(f"Worksheet relationship {rel_id} not found")
+
+
+def cell_value(cell, shared_strings):
+    cell_type = cell.get("t", "n")
+    if cell_type == "inlineStr":
+        return "".join(t.text or "" for t in cell.iter(f"{MAIN_NS}t")) or None
+
+    value = cell.find(f"{MAIN_NS}v")
+    if value is None or value.text is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(value.text)]
+    if cell_type == "b":
+        return "True" if value.text == "1" else "False"
+    if cell_type == "n":
+        return number_text(value.text)
+    return value.text
+
+
+def read_xlsx_rows(file_path, sheet_index=0):
+    """
+    Read a worksheet into a list of dictionaries without pandas.
+
+    The first row is the header. Values are returned as strings and empty
+    cells as None, matching pd.read_excel(file_path, dtype=str) after NaN
+    values are replaced with None.
+
+    Args:
+        file_path (str): Path of the .xlsx file.
+        sheet_index (int): Position of the worksheet in the workbook.
+
+    Returns:
+        list: One dictionary per data row, keyed by header.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        shared_strings = read_shared_strings(archive)
+        sheet = ET.fromstring(archive.read(sheet_path(archive, sheet_index)))
+
+    grid = {}
+    for row in sheet.iter(f"{MAIN_NS}row"):
+        for cell in row.iter(f"{MAIN_NS}c"):
+            match = CELL_REF_PATTERN.match(cell.get("r", ""))
+            if not match:
+                continue
+            value = cell_value(cell, shared_strings)
+            if value is not None:
+                grid[(int(match.group(2)), column_index(match.group(1)))] = value
+
+    if not grid:
+        return []
+
+    header_row = min(row for row, _ in grid)
+    last_row = max(row for row, _ in grid)
+    last_column = max(column for _, column in grid)
+
+    headers = []
+    for column in range(last_column + 1):
+        headers.append(grid.get((header_row, column)) or f"Unnamed: {column}")
+
+    rows = []
+    for row in range(header_row + 1, last_row + 1):
+        rows.append({header: grid.get((row, column)) for column, header in enumerate(headers)})
+    return rows